@@ -1,10 +1,16 @@
+import os
+import sys
+import tempfile
+import threading
+import time
 import unittest
 from typing import List
 
 from src.parser import *
 from src.errors import *
+from src.compiler import *
 
-from bytecode import Bytecode, Instr
+from bytecode import Bytecode, Instr, Label
 
 
 class LexerTest(unittest.TestCase):
@@ -198,17 +204,17 @@ class LexerTest(unittest.TestCase):
 
         tokens: List[Token] = output.get_tokens()
         self.assertEqual(tokens[0].ttype, TokenType.INT)
-        self.assertEqual(tokens[0].value, "21312312")
+        self.assertEqual(tokens[0].value, 21312312)
         self.assertEqual(tokens[0].lexeme, "21312312")
         self.assertEqual(tokens[0].position, Position(0, 8, 1, 1))
 
         self.assertEqual(tokens[1].ttype, TokenType.FLOAT)
-        self.assertEqual(tokens[1].value, "1231.21")
+        self.assertEqual(tokens[1].value, 1231.21)
         self.assertEqual(tokens[1].lexeme, "1231.21")
         self.assertEqual(tokens[1].position, Position(11, 18, 1, 12))
 
         self.assertEqual(tokens[2].ttype, TokenType.INT)
-        self.assertEqual(tokens[2].value, "21412")
+        self.assertEqual(tokens[2].value, 21412)
         self.assertEqual(tokens[2].lexeme, "21_4_1__2")
         self.assertEqual(tokens[2].position, Position(19, 28, 2, 1))
 
@@ -223,7 +229,7 @@ class LexerTest(unittest.TestCase):
         tokens: List[Token] = output.get_tokens()
 
         self.assertEqual(tokens[0].ttype, TokenType.INT)
-        self.assertEqual(tokens[0].value, "999")
+        self.assertEqual(tokens[0].value, 999)
         self.assertEqual(tokens[0].lexeme, "999")
         self.assertEqual(tokens[0].position, Position(0, 3, 1, 1))
 
@@ -233,7 +239,7 @@ class LexerTest(unittest.TestCase):
         self.assertEqual(tokens[1].position, Position(4, 4, 1, 5))
 
         self.assertEqual(tokens[2].ttype, TokenType.INT)
-        self.assertEqual(tokens[2].value, "1512")
+        self.assertEqual(tokens[2].value, 1512)
         self.assertEqual(tokens[2].lexeme, "1512_")
         self.assertEqual(tokens[2].position, Position(6, 11, 1, 7))
 
@@ -243,7 +249,7 @@ class LexerTest(unittest.TestCase):
         self.assertEqual(tokens[3].position, Position(11, 11, 1, 12))
 
         self.assertEqual(tokens[4].ttype, TokenType.INT)
-        self.assertEqual(tokens[4].value, "124")
+        self.assertEqual(tokens[4].value, 124)
         self.assertEqual(tokens[4].lexeme, "124")
         self.assertEqual(tokens[4].position, Position(13, 16,1, 14))
 
@@ -270,6 +276,146 @@ class LexerTest(unittest.TestCase):
         self.assertEqual(errors[0].text, "invalid syntax. Perhaps you forgot a comma?")
         self.assertEqual(errors[0].position, Position(0, 31, 1, 1))
 
+    def test_error_recovery(self):
+        code = "1 + 0x; 2 * 0b2; 3 + 0o9"
+        output: LexerOutput = Lexer(code, max_errors=10).tokenize()
+        self.assertEqual(
+            [(error.text, error.position.start_pos) for error in output.get_errors()],
+            [("invalid hexadecimal literal", 4), ("invalid binary literal", 12), ("invalid octal literal", 21)]
+        )
+        self.assertEqual([token.lexeme for token in output.get_tokens()], ["1", "+", ";", "2", "*", "2", ";", "3", "+", "9", "EOF"])
+
+        for engine in LexerEngine:
+            output = Lexer(code, engine=engine, max_errors=2).tokenize()
+            self.assertEqual(len(output.get_errors()), 2)
+            self.assertEqual([token.lexeme for token in output.get_tokens()], ["1", "+", ";", "2", "*", "EOF"])
+
+    def test_number_literals(self):
+        code = "0x1F 0o17 0b1_01 1e5 1.5e-3 2E+2_0 1e"
+
+        for engine in LexerEngine:
+            output: LexerOutput = Lexer(code, engine = engine).tokenize()
+            self.assertEqual(output.check_errors(), False)
+            self.assertEqual(
+                [(token.ttype, token.value, token.lexeme) for token in output.get_tokens()[:-1]],
+                [
+                    (TokenType.INT, 31, "0x1F"), (TokenType.INT, 15, "0o17"), (TokenType.INT, 5, "0b1_01"),
+                    (TokenType.FLOAT, 1e5, "1e5"), (TokenType.FLOAT, 1.5e-3, "1.5e-3"),
+                    (TokenType.FLOAT, 2e20, "2E+2_0"), (TokenType.INT, 1, "1"), (TokenType.IDENTIFIER, "e", "e")
+                ]
+            )
+
+            output = Lexer("12 0x_", engine = engine).tokenize()
+            self.assertEqual(output.get_errors()[0].text, "invalid hexadecimal literal")
+            self.assertEqual(output.get_errors()[0].position, Position(3, 6, 1, 4))
+
+            output = Lexer("1" * 5000 + "; 2", engine = engine, max_errors = 10).tokenize()
+            self.assertEqual(output.get_errors()[0].text,
+                             f"integer literal is too long, the limit is {sys.get_int_max_str_digits()} digits")
+            self.assertEqual(output.get_errors()[0].position, Position(0, 5000, 1, 1))
+            self.assertEqual([token.lexeme for token in output.get_tokens()], [";", "2", "EOF"])
+
+    def test_engines_match(self):
+        code = "\n+-*/ 1_2.5 abc_1 True\n\t++--==!=>>=<<=**//&&||??%^?:;()[]{} xor é1 2.2.2"
+
+        classic: LexerOutput = Lexer(code, engine=LexerEngine.Classic).tokenize()
+        regex: LexerOutput = Lexer(code, engine=LexerEngine.Regex).tokenize()
+
+        self.assertEqual(
+            [(token.ttype, token.value, token.lexeme, token.position) for token in regex.get_tokens()],
+            [(token.ttype, token.value, token.lexeme, token.position) for token in classic.get_tokens()]
+        )
+        self.assertEqual(
+            [(error.text, error.position) for error in regex.get_errors()],
+            [(error.text, error.position) for error in classic.get_errors()]
+        )
+        self.assertEqual(regex.check_errors(), True)
+
+    def test_chunked_source(self):
+        code = "124 + 16.2_5\n\t== abc_d ?? null\n(-12_000 >> 2) é1 && True"
+        expected: List[Token] = Lexer(code).tokenize().get_tokens()
+
+        data = code.encode()
+        sources = [
+            Lexer.from_chunks([code[:5], code[5:6], code[6:20], "", code[20:]]),
+            Lexer.from_chunks([data[i:i + 3] for i in range(0, len(data), 3)]),
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "code.ppl")
+            with open(path, "wb") as file:
+                file.write(data)
+            sources.append(Lexer.from_file(path, chunk_size = 4))
+
+            for lexer in sources:
+                output: LexerOutput = lexer.tokenize()
+                self.assertEqual(output.check_errors(), False)
+                self.assertEqual(
+                    [(token.ttype, token.value, token.lexeme, token.position) for token in output.get_tokens()],
+                    [(token.ttype, token.value, token.lexeme, token.position) for token in expected]
+                )
+
+    def test_parallel_lexing(self):
+        code = "124 + 16.2_5\n\t== abc_d ?? null\n(-12_000 >> 2)\né1 && True\n1.2.3 + 4\n5 6.6.6"
+        expected: LexerOutput = Lexer(code).tokenize()
+        output: LexerOutput = Lexer(code).tokenize_parallel(max_workers = 2, piece_size = 8)
+
+        self.assertEqual(
+            [(token.ttype, token.value, token.lexeme, token.position) for token in output.get_tokens()],
+            [(token.ttype, token.value, token.lexeme, token.position) for token in expected.get_tokens()]
+        )
+        self.assertEqual(
+            [(error.text, error.position) for error in output.get_errors()],
+            [(error.text, error.position) for error in expected.get_errors()]
+        )
+        self.assertEqual(len(output.get_errors()), 1)
+
+    def test_relex(self):
+        code = "\nab + 1e\n\tc >= 2"
+        output: LexerOutput = Lexer(code).tokenize()
+        edits = [
+            (3, 3, "c"),  # abc
+            (9, 9, "5"),  # 1e5
+            (11, 12, "\n"),
+            (0, 1, ""),
+            (15, 15, "="),  # >==
+            (0, 0, "1.2.3 "),
+        ]
+        for start, end, text in edits:
+            new_code = code[:start] + text + code[end:]
+            output = Lexer.relex(output, code, new_code, start, end)
+            expected: LexerOutput = Lexer(new_code).tokenize()
+            code = new_code
+
+            self.assertEqual(
+                [(token.ttype, token.value, token.lexeme, token.position) for token in output.get_tokens()],
+                [(token.ttype, token.value, token.lexeme, token.position) for token in expected.get_tokens()]
+            )
+            self.assertEqual(
+                [(error.text, error.position) for error in output.get_errors()],
+                [(error.text, error.position) for error in expected.get_errors()]
+            )
+        self.assertEqual(output.check_errors(), True)
+
+    def test_line_index(self):
+        code = "\n1 + 2\n\n  3.3.3 + 4"
+        output: LexerOutput = Lexer(code).tokenize()
+        lines: LineIndex = output.get_lines()
+
+        self.assertEqual(lines.locate(1), (1, 2))
+        self.assertEqual(lines.locate(9), (3, 2))
+        self.assertEqual(lines.line_text(1), "\n1 + 2")
+        self.assertEqual(lines.line_text(3), "  3.3.3 + 4")
+        self.assertEqual(lines.line_text(4), None)
+
+        error: PPLError = output.get_errors()[0]
+        self.assertEqual(error.position, Position(10, 15, 3, 3))
+        self.assertEqual(
+            error.show(lines),
+            "SyntaxError: invalid syntax. Perhaps you forgot a comma?\n"
+            "  3.3.3 + 4\n"
+            "  ^^^^^"
+        )
+
 
 class ParserTest(unittest.TestCase):
     def test_no_statement(self):
@@ -307,7 +453,7 @@ class ParserTest(unittest.TestCase):
         expected = AST.BlockStatement([
             AST.ExpressionStatement(
                 AST.ValueExpression(
-                    Token(TokenType.FLOAT, "2131.2", "2131.2", Position(0, 6, 1, 1))
+                    Token(TokenType.FLOAT, 2131.2, "2131.2", Position(0, 6, 1, 1))
                 )
             )
         ])
@@ -334,10 +480,10 @@ class ParserTest(unittest.TestCase):
                 AST.AdditiveExpression(
                     TokenType.PLUS,
                     AST.ValueExpression(
-                        Token(TokenType.FLOAT, "2131.2", "2131.2", Position(0, 6, 1, 1))
+                        Token(TokenType.FLOAT, 2131.2, "2131.2", Position(0, 6, 1, 1))
                     ),
                     AST.ValueExpression(
-                        Token(TokenType.FLOAT, "2131.2", "2131.2", Position(7, 13, 1, 8))
+                        Token(TokenType.FLOAT, 2131.2, "2131.2", Position(7, 13, 1, 8))
                     )
                 )
             )
@@ -870,4 +1016,669 @@ class ParserTest(unittest.TestCase):
         self.assertNotEqual(str(result["result"]), str(277.0))
 
 
+    def test_error_recovery(self):
+        code = "1 + ) 2; 3 * ; 4\n(5 + 6 7\nx y; 8 ?? 9"
+        tokens: List[Token] = Lexer(code).tokenize().get_tokens()
+
+        for engine in ParserEngine:
+            output: ParserOutput = Parser(tokens, engine, max_errors=10).parse()
+            self.assertEqual(
+                output.get_errors(),
+                [
+                    PPLParseException("Unknown expression: right paren", Position(4, 4, 1, 5)),
+                    PPLParseException("Unknown expression: semicolon", Position(13, 13, 1, 14)),
+                    PPLParseException("There should be a right paren", Position(25, 25, 2, 8)),
+                    PPLParseException("Unknown expression: identifier", Position(26, 27, 3, 1)),
+                ]
+            )
+            self.assertEqual(
+                [statement.output() for statement in output.get_result_statement().statements],
+                ["((Integer 2))", "((Integer 4))", "((Integer 7))", "((Integer 8))"]
+            )
+
+            output = Parser(tokens, engine, max_errors=2).parse()
+            self.assertEqual(len(output.get_errors()), 2)
+            self.assertEqual(len(output.get_result_statement().statements), 1)
+
+        compiler_output: CompilerOutput = Compiler(Parser(Lexer(code).iter_tokens(), max_errors=10)).compile()
+        self.assertEqual(len(compiler_output.get_errors()), 4)
+        self.assertEqual(compiler_output.get_instructions(), [])
+
+        output = Parser(Lexer("1; 2;").tokenize().get_tokens()).parse()
+        self.assertEqual(output.check_errors(), False)
+        self.assertEqual(len(output.get_result_statement().statements), 2)
+
+        # Errors of the lexer and of the parser are in one list in the order of positions, under one limit
+        code = "1 + True; 0x; 2 * ; 0b2; 3"
+        expected = [
+            ("ParseException", 0), ("SyntaxError", 10), ("ParseException", 12), ("ParseException", 18), ("SyntaxError", 20)
+        ]
+        for parser in (Parser(Lexer(code), max_errors=10), Parser(Lexer(code, max_errors=10).tokenize(), max_errors=10)):
+            output = parser.parse()
+            self.assertEqual(
+                [(error.output().split(":")[0], error.position.start_pos) for error in output.get_errors()],
+                expected
+            )
+        output = Parser(Lexer(code), max_errors=3).parse()
+        self.assertEqual(
+            [(error.output().split(":")[0], error.position.start_pos) for error in output.get_errors()],
+            expected[:3]
+        )
+        compiler_output = Compiler(Parser(Lexer(code, max_errors=10).tokenize(), max_errors=10)).compile_parallel(
+            slice_size=2
+        )
+        self.assertEqual(
+            [(error.output().split(":")[0], error.position.start_pos) for error in compiler_output.get_errors()],
+            expected
+        )
+
+        # A parse error found after a lexer error that comes earlier in the code doesn't push it out,
+        # an error at the end of the file comes last
+        code = "1.5;**-2**-1**-1 <<1.51.5-( is 1..2  is 1"
+        for max_errors in (2, 3, 10):
+            output = Parser(Lexer(code), max_errors=max_errors).parse()
+            self.assertEqual(
+                [(error.output().split(":")[0], error.position.start_pos) for error in output.get_errors()],
+                [("ParseException", 4), ("SyntaxError", 19), ("ParseException", 28), ("SyntaxError", 31),
+                 ("ParseException", 37), ("ParseException", -1)][:max_errors]
+            )
+
+    def test_reparse(self):
+        old_code = "1 + 2; 3 * 4\n5 - 6\n7 ?? 8"
+        lexer_output: LexerOutput = Lexer(old_code).tokenize()
+        previous: ParserOutput = Parser(lexer_output.get_tokens(), keep_spans=True).parse()
+        statements: List[AST.Statement] = list(previous.get_result_statement().statements)
+
+        # "3 * 4" -> "3 * 4 * 10"
+        new_code = old_code[:12] + " * 10" + old_code[12:]
+        lexer_output = Lexer.relex(lexer_output, old_code, new_code, 12, 12)
+        output: ParserOutput = Parser.reparse(previous, lexer_output.get_tokens())
+        expected: ParserOutput = Parser(Lexer(new_code).tokenize().get_tokens(), keep_spans=True).parse()
+
+        self.assertEqual(output.get_errors(), [])
+        self.assertIs(output.get_result_statement(), previous.get_result_statement())
+        self.assertEqual(output.get_result_statement().output(), expected.get_result_statement().output())
+        self.assertEqual(output.spans, expected.spans)
+        # Folded values of reused statements after the edit are moved with their tokens
+        self.assertEqual(
+            [(statement.expression.value.position, statement.expression.value.text())
+             for statement in output.get_result_statement().statements],
+            [(statement.expression.value.position, statement.expression.value.text())
+             for statement in expected.get_result_statement().statements]
+        )
+        self.assertEqual(output.get_result_statement().statements[2].expression.value.text(), "5 - 6")
+        reused: List[AST.Statement] = output.get_result_statement().statements
+        self.assertIs(reused[0], statements[0])
+        self.assertIsNot(reused[1], statements[1])
+        self.assertIs(reused[2], statements[2])
+        self.assertIs(reused[3], statements[3])
+
+        # "5 - 6" -> "5 - 6 +", the statement runs into the next one
+        old_code = new_code
+        new_code = old_code[:23] + " +" + old_code[23:]
+        lexer_output = Lexer.relex(lexer_output, old_code, new_code, 23, 23)
+        output = Parser.reparse(output, lexer_output.get_tokens())
+        expected = Parser(Lexer(new_code).tokenize().get_tokens(), keep_spans=True).parse()
+        self.assertEqual(output.get_result_statement().output(), expected.get_result_statement().output())
+        self.assertEqual(output.spans, expected.spans)
+        self.assertEqual(len(output.get_result_statement().statements), 3)
+
+        old_code = new_code
+        new_code = old_code + ")"
+        lexer_output = Lexer.relex(lexer_output, old_code, new_code, len(old_code), len(old_code))
+        output = Parser.reparse(output, lexer_output.get_tokens())
+        self.assertEqual(output.check_errors(), True)
+        self.assertEqual(output.get_errors()[0].text, "Unknown expression: right paren")
+
+        # New lines before the statements move their chars but not their tokens
+        old_code = "1 + 2; 3 * 4"
+        new_code = "\n\n" + old_code
+        lexer_output = Lexer(old_code).tokenize()
+        previous = Parser(lexer_output.get_tokens(), keep_spans=True).parse()
+        statements = list(previous.get_result_statement().statements)
+        lexer_output = Lexer.relex(lexer_output, old_code, new_code, 0, 0)
+        output = Parser.reparse(previous, lexer_output.get_tokens())
+        expected = Parser(Lexer(new_code).tokenize().get_tokens(), keep_spans=True).parse()
+        self.assertEqual(output.get_result_statement().statements, statements)
+        self.assertEqual(output.spans, expected.spans)
+        self.assertEqual(
+            [(statement.expression.value.position, statement.expression.value.text())
+             for statement in output.get_result_statement().statements],
+            [(statement.expression.value.position, statement.expression.value.text())
+             for statement in expected.get_result_statement().statements]
+        )
+
+    def test_parallel_compile(self):
+        code = "1 + 2; 3 * (4 - 5);\n6 ?? 7; 8 << 2;\n(9 + ; 10 * 11; 12 + True; 13 ) 14; 15"
+        tokens: List[Token] = Lexer(code).tokenize().get_tokens()
+
+        for max_errors in [1, 2, 10]:
+            expected: CompilerOutput = Compiler(Parser(tokens, max_errors=max_errors)).compile()
+            output: CompilerOutput = Compiler(Parser(tokens, max_errors=max_errors)).compile_parallel(
+                max_workers = 2, slice_size = 3
+            )
+            self.assertEqual(output.get_instructions(), expected.get_instructions())
+            self.assertEqual(output.get_errors(), expected.get_errors())
+        self.assertEqual(len(output.get_instructions()), 4)
+        self.assertEqual(len(output.get_errors()), 4)
+
+        output = Compiler(Parser(TokenBuffer.from_tokens(tokens, code), max_errors=10)).compile_parallel(
+            max_workers = 2, slice_size = 3
+        )
+        self.assertEqual(output.get_errors(), expected.get_errors())
+
+        def shape(instructions: list) -> list:
+            # Labels are new objects after they come back from a worker
+            return [
+                "label" if isinstance(instr, Label) else
+                (instr.name, "label") if isinstance(instr.arg, Label) else instr
+                for instr in instructions
+            ]
+
+        # Instructions without an argument and with labels come back from the workers,
+        # errors of the lexer stop the compilation at the same statement as the serial compilation
+        for code, max_errors in [("1; -(1/0); 2;", 1), ("1; (2 ** 99999) ?? 3; 4;", 1),
+                                 ("1; 2; 3.3.3; 4; 5 + ; 6", 5), ("1; 2; 3; 4.4.4 5", 10)]:
+            expected = Compiler(Parser(Lexer(code, max_errors=max_errors).tokenize(), max_errors=max_errors)).compile()
+            output = Compiler(Parser(Lexer(code, max_errors=max_errors).tokenize(), max_errors=max_errors)) \
+                .compile_parallel(max_workers = 2, slice_size = 2)
+            self.assertEqual(shape(output.get_instructions()), shape(expected.get_instructions()))
+            self.assertTrue(len(output.get_instructions()) > 0)
+            self.assertEqual(
+                [(error.text, error.position) for error in output.get_errors()],
+                [(error.text, error.position) for error in expected.get_errors()]
+            )
+
+        # An error at the end of the file is the last one in both
+        code = ";True+11..20+1.5==1..2"
+        expected = Compiler(Parser(Lexer(code, max_errors=2).tokenize(), max_errors=2,
+                                   optimizer=PassManager(0))).compile()
+        output = Compiler(Parser(Lexer(code, max_errors=2).tokenize(), max_errors=2,
+                                 optimizer=PassManager(0))).compile_parallel(max_workers = 2, slice_size = 2)
+        self.assertEqual(
+            [(error.text, error.position) for error in output.get_errors()],
+            [(error.text, error.position) for error in expected.get_errors()]
+        )
+        self.assertEqual(len(output.get_errors()), 2)
+
+    def test_code_cache(self):
+        def build(code: str):
+            builds.append(code)
+            instructions: List[Instr] = Compiler(Parser(Lexer(code).iter_tokens())).compile().get_instructions()
+            return Bytecode([
+                       Instr("RESUME", 0)
+                   ] + instructions +
+                   [
+                        Instr("STORE_NAME", "result"),
+                        Instr("LOAD_CONST", None),
+                        Instr("RETURN_VALUE")
+                   ]).to_code()
+
+        with tempfile.TemporaryDirectory() as directory:
+            builds: List[str] = []
+            cache: CodeCache = CodeCache(directory)
+            for _ in range(2):
+                result = {}
+                exec(cache.get("6 * 7", build), result)
+                self.assertEqual(result["result"], 42)
+            self.assertEqual(builds, ["6 * 7"])
+            self.assertNotEqual(CodeCache.key("6 * 7"), CodeCache.key("6 * 7", "-O0"))
+
+            # A broken file is a miss and it is written again
+            key: bytes = CodeCache.key("6 * 7")
+            with open(cache.path(key), "r+b") as file:
+                file.write(b"PPLD")
+            self.assertIsNone(cache.load(key))
+            cache.get("6 * 7", build)
+            self.assertEqual(builds, ["6 * 7", "6 * 7"])
+            self.assertIsNotNone(cache.load(key))
+
+            # The least recently used files are removed
+            cache.max_size = os.path.getsize(cache.path(key)) * 5 // 2
+            os.utime(cache.path(key), (1, 1))
+            for i, code in enumerate(["1 + 1", "2 + 2", "3 + 3"]):
+                cache.get(code, build)
+                os.utime(cache.path(CodeCache.key(code)), (i + 10, i + 10))
+                cache.evict()
+            self.assertEqual(
+                [cache.load(CodeCache.key(code)) is not None for code in ["6 * 7", "1 + 1", "2 + 2", "3 + 3"]],
+                [False, False, True, True]
+            )
+            self.assertEqual(len(os.listdir(directory)), 2)
+
+    def test_memory_cache(self):
+        def build(code: str):
+            builds.append(code)
+            instructions: List[Instr] = Compiler(Parser(Lexer(code).iter_tokens())).compile().get_instructions()
+            return Bytecode([
+                       Instr("RESUME", 0)
+                   ] + instructions +
+                   [
+                        Instr("STORE_NAME", "result"),
+                        Instr("LOAD_CONST", None),
+                        Instr("RETURN_VALUE")
+                   ]).to_code()
+
+        builds: List[str] = []
+        cache: MemoryCache = MemoryCache(max_entries = 2)
+        code = cache.get("6 * 7", build)
+        self.assertIs(cache.get(" 6  *\n7 ", build), code)
+        self.assertIsNot(cache.get("6 * 7", build, "-O0"), code)
+        cache.get("1 + 1", build)
+        self.assertEqual(builds, ["6 * 7", "6 * 7", "1 + 1"])
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 3, "evictions": 1, "expirations": 0, "entries": 2})
+
+        result = {}
+        exec(code, result)
+        self.assertEqual(result["result"], 42)
+
+        cache = MemoryCache(ttl = 0.01)
+        cache.get("6 * 7", build)
+        time.sleep(0.02)
+        cache.get("6 * 7", build)
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+        cache = MemoryCache()
+        codes = ["1 + 2", "3 * 4", "5 - 6", "7 ?? 8"]
+        threads: List[threading.Thread] = [
+            threading.Thread(target=lambda: [cache.get(code, build) for _ in range(100) for code in codes])
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats: dict = cache.stats()
+        self.assertEqual(stats["hits"] + stats["misses"], 1600)
+        self.assertEqual(stats["entries"], 4)
+
+    def test_arena(self):
+        code = "1 + 2 * 3\n-4.0 - (True ? 5 : 6)\n7 << 2 - (False ? 1)\nnull ?? 8 + (True - null)"
+        expected: AST.Statement = Parser(Lexer(code).tokenize().get_tokens()).parse().get_result_statement()
+
+        arena: AST.Arena = AST.Arena.from_statements(
+            Parser(Lexer(code).tokenize().get_tokens()).iter_statements(optimize=False)
+        )
+        self.assertEqual(arena.check_error(), None)
+        self.assertEqual(
+            arena.output(),
+            AST.BlockStatement(list(Parser(Lexer(code).tokenize().get_tokens()).iter_statements(optimize=False))).output()
+        )
+
+        arena.optimize()
+        self.assertEqual(arena.output(), expected.output())
+        self.assertEqual(
+            [type(instr) for instr in arena.compile()],
+            [type(instr) for instr in expected.compile()]
+        )
+        self.assertEqual(arena.check_error().text, expected.check_error().text)
+        self.assertEqual(arena.check_error().position, expected.check_error().position)
+
+        arena = AST.Arena.from_statements(
+            Parser(Lexer("1 + 2 * 3\n(7 >> 1) - (True ? 1)").tokenize().get_tokens()).iter_statements(optimize=False)
+        )
+        bytecode = ([
+                       Instr("RESUME", 0)
+                   ] + arena.optimize().compile() +
+                   [
+                        Instr("STORE_NAME", "result"),
+                        Instr("LOAD_CONST", None),
+                        Instr("RETURN_VALUE")
+                   ])
+        result = {}
+        exec(Bytecode(bytecode).to_code(), result)
+        self.assertEqual(result["result"], 2)
+
+    def test_folding(self):
+        code = "1 - -2.5\n7 // 2.0 == 3\nTrue xor False\nTrue + 1\n1 is 1"
+        parser_output: ParserOutput = Parser(Lexer(code).tokenize().get_tokens(), max_errors=10).parse()
+        self.assertEqual(
+            [statement.output() for statement in parser_output.get_result_statement().statements],
+            [
+                "((Float 3.5))", "((Bool True))", "((Bool True))",
+                "(ParseException: Can't use Bool plus Integer)",
+                "(ParseException: \"is\" with 'Integer' literal. Did you mean \"==\"?)"
+            ]
+        )
+        self.assertEqual(
+            parser_output.get_errors(),
+            [
+                PPLParseException("Can't use Bool plus Integer", Position(38, 46, 4, 1)),
+                PPLSyntaxWarning("\"is\" with 'Integer' literal. Did you mean \"==\"?", Position(47, 53, 5, 1))
+            ]
+        )
+
+        self.assertEqual(AST.FOLDS[TokenType.STAR, AST.ValueType.Integer, AST.ValueType.Float][0], TokenType.FLOAT)
+
+        # The type of a power of integers follows its value
+        parser_output = Parser(Lexer("2 ** -1 + 1\n2 ** 3\n(2 ** -1) & 1").tokenize().get_tokens(), max_errors=10).parse()
+        self.assertEqual(
+            [statement.output() for statement in parser_output.get_result_statement().statements],
+            ["((Float 1.5))", "((Integer 8))", "(ParseException: Can't use Float ampersand Integer)"]
+        )
+        self.assertEqual(AST.FOLDS.get((TokenType.STAR, AST.ValueType.Bool, AST.ValueType.Integer)), None)
+
+    def test_folded_text(self):
+        code = "7 +\n - 2 * 3"
+        statement: AST.Statement = Parser(Lexer(code).tokenize().get_tokens()).parse_statement().optimize()
+        token: Token = statement.expression.value
+        self.assertEqual(token.value, 1)
+        self.assertEqual(token.lexeme, None)
+        self.assertEqual(token.text(), code)
+        self.assertEqual(token.position, Position(0, 12, 1, 1))
+
+        arena: AST.Arena = AST.Arena.from_statements(
+            Parser(Lexer(code).tokenize().get_tokens()).iter_statements(optimize=False)
+        ).optimize()
+        self.assertEqual(arena.node(arena.roots[0]).value.text(), code)
+
+        # Without the code only the span is known
+        tokens: List[Token] = list(Lexer.from_chunks(iter([code])).iter_tokens())
+        statement = Parser(tokens).parse_statement().optimize()
+        self.assertEqual(statement.expression.value.text(), None)
+
+    def test_fold_budget(self):
+        budget: AST.FoldBudget = AST.FOLD_BUDGET
+        budget.reset()
+        parser_output: ParserOutput = Parser(Lexer("2 ** 99999999\n1 << 10 ** 9\n3 ** 4\n1 / 0").tokenize().get_tokens()).parse()
+        self.assertEqual(parser_output.check_errors(), False)
+        self.assertEqual(
+            [statement.output() for statement in parser_output.get_result_statement().statements],
+            [
+                "(((Integer 2) power (Integer 99999999)))",
+                "(((Integer 1) left shift (Integer 1000000000)))",
+                "((Integer 81))",
+                "(((Integer 1) slash (Integer 0)))"
+            ]
+        )
+        self.assertEqual(budget.stats(), {"estimated": 4, "deferred": 2, "failed": 1, "max_cost": 1000000001})
+
+        # An exponent too large for a float is over the budget too
+        parser_output = Parser(Lexer("2 ** (10 ** 400); (-3) ** " + "9" * 400).tokenize().get_tokens()).parse()
+        self.assertEqual(parser_output.check_errors(), False)
+        self.assertEqual(
+            [statement.output() for statement in parser_output.get_result_statement().statements],
+            [f"(((Integer 2) power (Integer {10 ** 400})))", f"(((Integer -3) power (Integer {'9' * 400})))"]
+        )
+
+        max_bits = budget.max_bits
+        budget.max_bits = 8
+        try:
+            statement: AST.Statement = Parser(Lexer("2 ** 10 - 1").tokenize().get_tokens()).parse_statement()
+            statement = statement.optimize()
+        finally:
+            budget.max_bits = max_bits
+        self.assertEqual(statement.output(), "((((Integer 2) power (Integer 10)) minus (Integer 1)))")
+
+        bytecode = ([
+                       Instr("RESUME", 0)
+                   ] + statement.compile() +
+                   [
+                        Instr("STORE_NAME", "result"),
+                        Instr("LOAD_CONST", None),
+                        Instr("RETURN_VALUE")
+                   ])
+        result = {}
+        exec(Bytecode(bytecode).to_code(), result)
+        self.assertEqual(result["result"], 1023)
+
+    def test_pass_manager(self):
+        tokens: List[Token] = Lexer("1 + 2\nTrue + 1").tokenize().get_tokens()
+        optimizer: PassManager = PassManager.from_flag("-O0")
+        parser_output: ParserOutput = Parser(tokens, max_errors=10, optimizer=optimizer).parse()
+        # Nothing is folded, so the error is raised when the program runs
+        self.assertEqual(parser_output.check_errors(), False)
+        self.assertEqual(
+            [statement.output() for statement in parser_output.get_result_statement().statements],
+            ["(((Integer 1) plus (Integer 2)))", "(((Bool True) plus (Integer 1)))"]
+        )
+        self.assertEqual(optimizer.flags, "-O0")
+
+        code = "(True ? 2 : 2 ** 99999999) + 1;\n(1 << 99999999) * 1 + 0 + 1 + 2;\n-(-(1 << 99999999));\nFalse ? 1"
+        optimizer = PassManager.from_flag("-O2", count_nodes=True)
+        parser_output = Parser(Lexer(code).tokenize().get_tokens(), optimizer=optimizer).parse()
+        self.assertEqual(parser_output.check_errors(), False)
+        self.assertEqual(
+            [statement.output() for statement in parser_output.get_result_statement().statements],
+            [
+                "((Integer 3))",
+                "((((Integer 1) left shift (Integer 99999999)) plus (Integer 3)))",
+                "(((Integer 1) left shift (Integer 99999999)))",
+                "((Null null))"
+            ]
+        )
+        self.assertEqual(
+            [(stats["pass"], stats["runs"], stats["node_delta"]) for stats in optimizer.report()],
+            [("fold", 4, 0), ("dead-branches", 4, -7), ("simplify", 4, -6), ("reassociate", 4, -2), ("refold", 4, -2)]
+        )
+        self.assertEqual(optimizer.flags, "-O2")
+
+        # The default pipeline is the constant folding of Statement.optimize()
+        parser_output = Parser(Lexer(code).tokenize().get_tokens(), optimizer=PassManager()).parse()
+        self.assertEqual(
+            parser_output.get_result_statement().statements[0].output(),
+            "((((Bool True) ? (Integer 2) : ((Integer 2) power (Integer 99999999))) plus (Integer 1)))"
+        )
+        self.assertEqual(PassManager(passes=["simplify", "fold"]).flags, "-O:simplify,fold")
+
+        # Folding twice changes nothing, so -O2 computes what -O1 does around folds left to runtime
+        code = "((1 << 9000) - (1 << 9000)) + (0.5 * 2);\n(-(((1 << 9000) - 7) ^ (1 % 2.5)) < 1) ?? 1"
+        results = []
+        for flag in ("-O1", "-O2"):
+            parser_output = Parser(Lexer(code).tokenize().get_tokens(), optimizer=PassManager.from_flag(flag)).parse()
+            self.assertEqual(parser_output.check_errors(), False)
+            for statement in parser_output.get_result_statement().statements:
+                bytecode = ([
+                               Instr("RESUME", 0)
+                           ] + statement.compile() +
+                           [
+                                Instr("STORE_NAME", "result"),
+                                Instr("LOAD_CONST", None),
+                                Instr("RETURN_VALUE")
+                           ])
+                result = {}
+                try:
+                    exec(Bytecode(bytecode).to_code(), result)
+                except TypeError:
+                    result["result"] = TypeError
+                results.append((flag, type(result["result"]), result["result"]))
+        self.assertEqual(
+            results,
+            [("-O1", float, 1.0), ("-O1", type, TypeError), ("-O2", float, 1.0), ("-O2", type, TypeError)]
+        )
+
+        # A value the other passes expose isn't type checked, -O2 accepts what -O1 does
+        code = "(True ? 1 : (1 << 100000)) & True;\n(False ? (1 << 100000) : True) + 1;\n(2 ** 99999) ?? 1 + 1"
+        for flag, output in (
+                ("-O1", "((((Bool True) ? (Integer 1) : ((Integer 1) left shift (Integer 100000))) ampersand (Bool True)))"),
+                ("-O2", "(((Integer 1) ampersand (Bool True)))")
+        ):
+            parser_output = Parser(Lexer(code).tokenize().get_tokens(), optimizer=PassManager.from_flag(flag)).parse()
+            self.assertEqual(parser_output.check_errors(), False)
+            statements = parser_output.get_result_statement().statements
+            self.assertEqual(statements[0].output(), output)
+            for statement in statements:
+                statement.compile()
+        parser_output = Parser(Lexer("True + 1; (1 ? 2 : 3) + 1").tokenize().get_tokens(), max_errors=10,
+                               optimizer=PassManager.from_flag("-O2")).parse()
+        self.assertEqual(
+            [(error.text, error.position.start_pos) for error in parser_output.errors],
+            [(error.text, error.position.start_pos) for error in Parser(
+                Lexer("True + 1; (1 ? 2 : 3) + 1").tokenize().get_tokens(), max_errors=10
+            ).parse().errors]
+        )
+        self.assertRaises(ValueError, PassManager.from_flag, "-O3")
+
+    def test_token_stream(self):
+        code = "124 >> 16 > 1 ? 214 (1 + 2) * 3 null ?? 5 -124.0 * 16"
+
+        lexer_output: LexerOutput = Lexer(code).tokenize()
+        parser_output: ParserOutput = Parser(lexer_output.get_tokens()).parse()
+
+        lexer: Lexer = Lexer(code)
+        parser: Parser = Parser(lexer.iter_tokens())
+        stream_output: ParserOutput = parser.parse()
+
+        self.assertEqual(lexer.errors, [])
+        self.assertEqual(stream_output.get_errors(), [])
+        self.assertEqual(
+            stream_output.get_result_statement().output(),
+            parser_output.get_result_statement().output()
+        )
+        self.assertLess(len(parser.tokens), len(lexer_output.get_tokens()))
+
+    def test_token_buffer(self):
+        code = "124 >> 16 > 1 ? 2_14 : 1.5\n(1 + 2) * -3 null ?? 5 -124.0 * 16"
+
+        tokens: List[Token] = Lexer(code).tokenize().get_tokens()
+        buffer: TokenBuffer = TokenBuffer.from_tokens(Lexer(code).iter_tokens(), code)
+
+        self.assertEqual(len(buffer), len(tokens))
+        self.assertEqual(
+            [(token.ttype, token.value, token.lexeme, token.position) for token in buffer],
+            [(token.ttype, token.value, token.lexeme, token.position) for token in tokens]
+        )
+
+        # Kinds of a buffer stay a byte per token
+        self.assertEqual(Parser(buffer).kinds.itemsize, 1)
+        self.assertEqual(list(Parser(buffer).kinds), Parser(tokens).kinds)
+
+        parser_output: ParserOutput = Parser(tokens).parse()
+        buffer_output: ParserOutput = Parser(buffer).parse()
+
+        self.assertEqual(buffer_output.get_errors(), [])
+        self.assertEqual(
+            buffer_output.get_result_statement().output(),
+            parser_output.get_result_statement().output()
+        )
+
+    def test_native_values(self):
+        tokens: List[Token] = Lexer("1_024 2.5 True False null name").tokenize().get_tokens()
+        self.assertEqual(
+            [(token.ttype, token.value) for token in tokens],
+            [
+                (TokenType.INT, 1024), (TokenType.FLOAT, 2.5), (TokenType.BOOL, True), (TokenType.BOOL, False),
+                (TokenType.NULL, None), (TokenType.IDENTIFIER, "name"), (TokenType.EOF, None)
+            ]
+        )
+
+        code = "2 ** 10 == 1_024 1.5 == 1.5 4.0 * 2 null ?? null"
+        parser_output: ParserOutput = Parser(Lexer(code).tokenize().get_tokens()).parse()
+
+        self.assertEqual(parser_output.get_errors(), [])
+        self.assertEqual(
+            parser_output.get_result_statement().output(),
+            "[\n((Bool True))\n((Bool True))\n((Integer 8))\n((Null null))\n]"
+        )
+
+    def test_precedence(self):
+        code = "1 + 2 * 3 - 4 << 1 > 2 == True & 1 | 2 ^ 3 && True ?? null ? 1 : 2"
+
+        parser: Parser = Parser(Lexer(code).tokenize().get_tokens())
+        statement: AST.Statement = parser.parse_statement()
+
+        self.assertEqual(parser.errors, [])
+        self.assertEqual(
+            statement.output(),
+            "((((((((((((Integer 1) plus ((Integer 2) star (Integer 3))) minus (Integer 4)) left shift (Integer 1))"
+            " greater than (Integer 2)) equal operator (Bool True)) ampersand (Integer 1))"
+            " bar ((Integer 2) caret (Integer 3))) and operator (Bool True)) null coalesce operator (Null null))"
+            " ? (Integer 1) : (Integer 2)))"
+        )
+
+    def test_stack_engine(self):
+        codes = [
+            "1 + 2 * 3 - 4 << 1 > 2 == True & 1 | 2 ^ 3 && True ?? null ? 1 : 2",
+            "-(1 + 2) * (3 > 2 ? (4 ?? 5) : 6 is not 7) ? 8",
+            "(1 + 2 * 3",
+            "1 + * 2",
+        ]
+        for code in codes:
+            tokens: List[Token] = Lexer(code).tokenize().get_tokens()
+            recursive: Parser = Parser(tokens)
+            stack: Parser = Parser(tokens, ParserEngine.Stack)
+            recursive_statement: AST.Statement = recursive.parse_statement()
+            stack_statement: AST.Statement = stack.parse_statement()
+
+            self.assertEqual(stack.errors, recursive.errors)
+            self.assertEqual(stack.pos, recursive.pos)
+            if not recursive.errors:
+                self.assertEqual(stack_statement.output(), recursive_statement.output())
+
+        depth = 5000
+        parser: Parser = Parser(Lexer("(1 + " * depth + "1" + ")" * depth).tokenize().get_tokens(), ParserEngine.Stack)
+        expression: AST.Expression = parser.parse_statement().expression
+        self.assertEqual(parser.errors, [])
+        for _ in range(depth):
+            self.assertIsInstance(expression, AST.AdditiveExpression)
+            expression = expression.expr2
+        self.assertEqual(expression.value.value, 1)
+
+    def test_deep_tree(self):
+        terms = 50000
+        parser: Parser = Parser(Lexer(" + ".join(["1"] * terms) + " - (True ? 1)").tokenize().get_tokens())
+        statement: AST.Statement = parser.parse_statement()
+
+        self.assertEqual(parser.errors, [])
+        self.assertEqual(statement.check_error(), None)
+        self.assertTrue(statement.output().endswith("(Integer 1)) minus ((Bool True) ? (Integer 1))))"))
+
+        bytecode = ([
+                       Instr("RESUME", 0)
+                   ] + statement.compile() +
+                   [
+                        Instr("STORE_NAME", "result"),
+                        Instr("LOAD_CONST", None),
+                        Instr("RETURN_VALUE")
+                   ])
+        result = {}
+        exec(Bytecode(bytecode).to_code(), result)
+        self.assertEqual(result["result"], terms - 1)
+
+        statement = statement.optimize()
+        self.assertEqual(statement.output(), f"(((Integer {terms}) minus ((Bool True) ? (Integer 1))))")
+
+    def test_statement_stream(self):
+        code = "1 + 2\n3 * (True ? 4 : 5)\nnull ?? 6 - (True ? 1)\n7 ** 2"
+        expected: ParserOutput = Parser(Lexer(code).tokenize().get_tokens()).parse()
+
+        parser: Parser = Parser(Lexer(code).iter_tokens())
+        statements: List[AST.Statement] = list(parser.iter_statements())
+        self.assertEqual(parser.errors, [])
+        self.assertEqual(
+            [statement.output() for statement in statements],
+            [statement.output() for statement in expected.get_result_statement().statements]
+        )
+
+        compiler_output: CompilerOutput = Compiler(Parser(Lexer(code).iter_tokens())).compile()
+        self.assertEqual(compiler_output.check_errors(), False)
+        self.assertEqual(
+            [type(instr) for instr in compiler_output.get_instructions()],
+            [type(instr) for instr in expected.get_result_statement().compile()]
+        )
+
+        bytecode = ([
+                       Instr("RESUME", 0)
+                   ] + compiler_output.get_instructions() +
+                   [
+                        Instr("STORE_NAME", "result"),
+                        Instr("LOAD_CONST", None),
+                        Instr("RETURN_VALUE")
+                   ])
+        result = {}
+        exec(Bytecode(bytecode).to_code(), result)
+        self.assertEqual(result["result"], 49)
+
+        compiler_output = Compiler(Parser(Lexer("1 + 2\n3 + True\n4").iter_tokens())).compile()
+        self.assertEqual(compiler_output.check_errors(), True)
+        self.assertEqual(compiler_output.get_instructions(), [Instr("LOAD_CONST", 3)])
+
+        # A bad lexeme of the streamed code is reported, the statements after it aren't compiled
+        compiler_output = Compiler(Parser(Lexer("1 + 2\n3.3.3\n4"))).compile()
+        errors: List[PPLError] = compiler_output.get_errors()
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(isinstance(errors[0], PPLSyntaxError))
+        self.assertEqual(errors[0].position, Position(6, 11, 2, 1))
+        self.assertEqual(compiler_output.get_instructions(), [Instr("LOAD_CONST", 3)])
+
 unittest.main(exit = False)
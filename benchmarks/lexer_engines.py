@@ -0,0 +1,49 @@
+"""
+Compares the speed of Lexer engines on a generated program.
+
+Run from the repository root:
+    python -m benchmarks.lexer_engines [size in KiB]
+"""
+import os
+import random
+import sys
+import timeit
+
+from src.parser import Lexer, LexerEngine
+
+
+def generate_code(size: int) -> str:
+    random.seed(0)
+    parts = [
+        "124", "16.251", "1_000", "True", "False", "null", "value", "other_value",
+        "+", "-", "*", "/", "//", "**", "%", ">>", "<<", "&", "|", "^",
+        "==", "!=", ">", ">=", "<", "<=", "&&", "||", "??", "?", ":", "(", ")", "and", "xor", "or",
+    ]
+    lines = []
+    length = 0
+    while length < size:
+        line = " ".join(random.choice(parts) for _ in range(random.randint(4, 16)))
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines)
+
+
+def main() -> None:
+    size = int(sys.argv[1]) * 1024 if len(sys.argv) > 1 else 1024 * 1024
+    code = generate_code(size)
+    print(f"code size: {len(code)} chars")
+
+    for engine in LexerEngine:
+        # iter_tokens() is always serial, tokenize() may use the process pool for large code
+        tokens = list(Lexer(code, engine=engine).iter_tokens())
+        seconds = min(timeit.repeat(lambda: list(Lexer(code, engine=engine).iter_tokens()), number=1, repeat=3))
+        print(f"{engine.name:>8}: {seconds:.3f} s, {len(tokens)} tokens, "
+              f"{len(code) / seconds / 1024 / 1024:.2f} MiB/s")
+
+    seconds = min(timeit.repeat(lambda: Lexer(code).tokenize_parallel(), number=1, repeat=3))
+    print(f"{'Parallel':>8}: {seconds:.3f} s, {os.cpu_count()} CPUs, "
+          f"{len(code) / seconds / 1024 / 1024:.2f} MiB/s")
+
+
+if __name__ == "__main__":
+    main()
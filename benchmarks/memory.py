@@ -0,0 +1,99 @@
+"""
+Measures memory taken by tokens and by AST nodes,
+and peak memory of compiling a whole program at once and statement by statement.
+
+Run from the repository root:
+    python -m benchmarks.memory [number of statements]
+"""
+import random
+import sys
+import tracemalloc
+
+from src.parser import Lexer, Parser, AST
+from src.compiler import Compiler
+
+OPERATORS = ["+", "-", "*", "/", "//", "%", ">>", "<<", "&", "|", "^", "==", "!=", ">", "<", "??"]
+# Operators that never fail on integers, so the whole program compiles
+SAFE_OPERATORS = ["+", "-", "*"]
+
+
+def generate_code(statements: int, operators: list = OPERATORS, floats: bool = True) -> str:
+    random.seed(0)
+    lines = []
+    for _ in range(statements):
+        parts = [str(random.randint(1, 1000))]
+        for _ in range(random.randint(2, 12)):
+            parts.append(random.choice(operators))
+            if floats and random.random() >= 0.8:
+                parts.append(f"-{random.randint(1, 9)}.5")
+            else:
+                parts.append(str(random.randint(1, 1000)))
+        lines.append(" ".join(parts))
+    return "\n".join(lines)
+
+
+def count_nodes(node) -> int:
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            continue
+        count += 1
+        for name in ("expr", "expr1", "expr2", "condition_expr", "true_expr", "false_expr", "expression"):
+            child = getattr(node, name, None)
+            if child is not None:
+                stack.append(child)
+    return count
+
+
+def main() -> None:
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    code = generate_code(statements)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tokens = Lexer(code).tokenize().get_tokens()
+    for token in tokens:
+        # Line and column are found lazily, count them as well
+        token.position.line
+    after = tracemalloc.get_traced_memory()[0]
+    print(f"tokens: {len(tokens)}, {(after - before) / len(tokens):.1f} bytes per token")
+
+    parser = Parser(tokens)
+    before = tracemalloc.get_traced_memory()[0]
+    nodes = []
+    while not parser.is_at_end():
+        nodes.append(parser.parse_statement())
+    after = tracemalloc.get_traced_memory()[0]
+    count = sum(count_nodes(node) for node in nodes)
+    print(f"AST nodes: {count}, {(after - before) / count:.1f} bytes per node (unoptimized)")
+
+    before = tracemalloc.get_traced_memory()[0]
+    arena = AST.Arena.from_statements(nodes)
+    after = tracemalloc.get_traced_memory()[0]
+    # Node objects hold the tokens, the arena doesn't need them after it is built
+    print(f"arena nodes: {len(arena)}, {(after - before) / len(arena):.1f} bytes per node (unoptimized)")
+    del tokens, parser, nodes, arena
+
+    # Folding would leave one value per statement, compile the trees as they are
+    code = generate_code(statements, SAFE_OPERATORS, floats=False).replace(" - ", " - (True ? 1) * ")
+
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    output = Parser(Lexer(code).tokenize().get_tokens()).parse()
+    instructions = output.get_result_statement().compile()
+    peak = tracemalloc.get_traced_memory()[1]
+    print(f"whole program: {len(instructions)} instructions, peak {(peak - before) / 2 ** 20:.1f} MiB")
+    del output, instructions
+
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    compiler_output = Compiler(Parser(Lexer(code))).compile()
+    peak = tracemalloc.get_traced_memory()[1]
+    print(f"statement by statement: {len(compiler_output.get_instructions())} instructions, "
+          f"peak {(peak - before) / 2 ** 20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Measures the speed of Parser engines on generated expressions and on deeply nested expressions,
+the cost of the optimization levels and the speed of serial and parallel compilation.
+
+Run from the repository root:
+    python -m benchmarks.parser [number of statements]
+"""
+import os
+import sys
+import timeit
+
+from src.parser import Lexer, Parser, ParserEngine, PassManager, PIPELINES
+from src.compiler import Compiler
+from .memory import generate_code, SAFE_OPERATORS
+
+DEPTHS = [100, 1000, 10000, 100000]
+
+
+def parse(tokens, engine: ParserEngine) -> int:
+    parser = Parser(tokens, engine)
+    statements = 0
+    while not parser.is_at_end():
+        parser.parse_statement()
+        statements += 1
+    return statements
+
+
+def nested_code(depth: int) -> str:
+    return "(-1 + " * depth + "1" + ")" * depth
+
+
+def main() -> None:
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    tokens = Lexer(generate_code(statements)).tokenize().get_tokens()
+
+    for engine in ParserEngine:
+        seconds = min(timeit.repeat(lambda: parse(tokens, engine), number=1, repeat=3))
+        print(f"{engine.name:>9}: {len(tokens)} tokens, {seconds:.3f} s, "
+              f"{len(tokens) / seconds / 1000:.0f} K tokens/s")
+
+    # Statements end with semicolons, so the parallel compilation can split them
+    code = generate_code(statements, SAFE_OPERATORS, floats=False).replace("\n", ";\n")
+    tokens = Lexer(code).tokenize().get_tokens()
+    # The code has no errors, so every statement is optimized
+    for level in PIPELINES:
+        optimizer = PassManager(level)
+        seconds = min(timeit.repeat(lambda: list(Parser(tokens, optimizer=optimizer).iter_statements()),
+                                    number=1, repeat=3))
+        print(f"{f'-O{level}':>9}: parsed and optimized {len(tokens)} tokens in {seconds:.3f} s")
+    for stats in optimizer.report():
+        print(f"{stats['pass']:>13}: {stats['seconds'] / stats['runs'] * 1e6:.2f} us per statement")
+
+    # iter_instructions() is always serial, compile() may use the process pool for many tokens
+    seconds = min(timeit.repeat(lambda: list(Compiler(Parser(tokens)).iter_instructions()), number=1, repeat=3))
+    print(f"{'Serial':>9}: compiled {len(tokens)} tokens in {seconds:.3f} s")
+    seconds = min(timeit.repeat(lambda: Compiler(Parser(tokens)).compile_parallel(), number=1, repeat=3))
+    print(f"{'Parallel':>9}: compiled {len(tokens)} tokens in {seconds:.3f} s, {os.cpu_count()} CPUs")
+
+    print("nesting depth:")
+    for depth in DEPTHS:
+        tokens = Lexer(nested_code(depth)).tokenize().get_tokens()
+        for engine in ParserEngine:
+            try:
+                seconds = min(timeit.repeat(lambda: parse(tokens, engine), number=1, repeat=3))
+            except RecursionError:
+                print(f"{engine.name:>9}: {depth:>6} levels, RecursionError")
+                continue
+            print(f"{engine.name:>9}: {depth:>6} levels, {seconds:.4f} s, "
+                  f"{seconds / depth * 1e6:.2f} us per level")
+
+
+if __name__ == "__main__":
+    main()
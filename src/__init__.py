@@ -1 +1 @@
-from . import parser, errors
+from . import parser, errors, compiler
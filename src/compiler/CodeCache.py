@@ -0,0 +1,186 @@
+import hashlib
+import marshal
+import os
+import struct
+import tempfile
+import time
+from importlib.util import MAGIC_NUMBER
+from types import CodeType
+from typing import Callable, List, Optional, Tuple
+
+from .Compiler import COMPILER_VERSION
+
+# Header of a .pplc file: magic, format version, compiler version,
+# magic number of the Python that marshalled the code, key digest and size of the code
+HEADER = struct.Struct("<4sHH4s32sQ")
+MAGIC = b"PPLC"
+# Bump when the layout of .pplc files changes
+FORMAT_VERSION = 1
+SUFFIX = ".pplc"
+TEMP_PREFIX = ".tmp-"
+TEMP_SUFFIX = ".tmp"
+
+# Default limit of the total size of a cache directory
+MAX_SIZE = 64 << 20
+# Temp files of writers that died are removed after this many seconds
+STALE_TEMP_AGE = 3600
+
+
+class CodeCache:
+    """
+    On-disk cache of compiled programs, like __pycache__ for Python modules.
+    A program is keyed by the hash of its source, COMPILER_VERSION and compiler flags,
+    every program is stored as a marshalled code object in its own .pplc file.
+
+    Files are written to a temp file and renamed, so a reader sees a whole file or no file.
+    Any number of processes may use one directory: a file that is broken, from another version
+    or removed by another process is just a miss. When the directory grows over max_size,
+    the least recently used files are removed
+
+    Location "src/compiler/CodeCache.py"
+    """
+    directory: str
+    max_size: int
+
+    def __init__(self, directory: str | os.PathLike, max_size: int = MAX_SIZE) -> None:
+        """
+        :param directory: Directory of .pplc files, it is created if it doesn't exist
+        :param max_size: Limit of the total size of the files in bytes
+        """
+        self.directory = os.fspath(directory)
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(source: str, flags: str = "") -> bytes:
+        """
+        :param source: The code of the program
+        :param flags: Compiler flags that change the output, e.g. the optimization level
+        :return: Digest that identifies the compiled program
+        """
+        digest = hashlib.sha256()
+        digest.update(f"{COMPILER_VERSION}\0{flags}\0".encode())
+        digest.update(source.encode("utf-8", "surrogatepass"))
+        return digest.digest()
+
+    def get(self, source: str, build: Callable[[str], CodeType], flags: str = "") -> CodeType:
+        """
+        Loads the program from the cache, on a miss builds it and stores it
+        :param source: The code of the program
+        :param build: Compiles the code to a code object, e.g. with Compiler and Bytecode.to_code()
+        :param flags: Compiler flags that change the output
+        """
+        key = self.key(source, flags)
+        code = self.load(key)
+        if code is None:
+            code = build(source)
+            self.store(key, code)
+        return code
+
+    def path(self, key: bytes) -> str:
+        return os.path.join(self.directory, key.hex() + SUFFIX)
+
+    def load(self, key: bytes) -> Optional[CodeType]:
+        """
+        :param key: Key of the program, see CodeCache.key()
+        :return: The code object or None on a miss
+        """
+        path = self.path(key)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+
+        if len(data) < HEADER.size:
+            return None
+        magic, format_version, compiler_version, python_magic, stored_key, size = HEADER.unpack_from(data)
+        if magic != MAGIC or format_version != FORMAT_VERSION or compiler_version != COMPILER_VERSION or \
+                python_magic != MAGIC_NUMBER or stored_key != key or size != len(data) - HEADER.size:
+            return None
+        try:
+            code = marshal.loads(memoryview(data)[HEADER.size:])
+        except (EOFError, ValueError, TypeError):
+            return None
+        if not isinstance(code, CodeType):
+            return None
+
+        # The modification time tells how recently a file was used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return code
+
+    def store(self, key: bytes, code: CodeType) -> None:
+        """
+        Writes the code object and removes the least recently used files if the cache is too large.
+        The cache is only an accelerator, a file that can't be written is skipped
+        :param key: Key of the program, see CodeCache.key()
+        :param code: The compiled program
+        """
+        payload = marshal.dumps(code)
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, COMPILER_VERSION, MAGIC_NUMBER, key, len(payload))
+        try:
+            fd, temp_path = tempfile.mkstemp(TEMP_SUFFIX, TEMP_PREFIX, self.directory)
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(header)
+                file.write(payload)
+            os.replace(temp_path, self.path(key))
+        except OSError:
+            remove(temp_path)
+            return
+        except BaseException:
+            remove(temp_path)
+            raise
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used files until the total size is at most max_size.
+        Files removed by another process meanwhile are skipped
+        """
+        files: List[Tuple[float, int, str]] = []
+        total = 0
+        now = time.time()
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if entry.name.startswith(TEMP_PREFIX):
+                if now - stat.st_mtime > STALE_TEMP_AGE:
+                    remove(entry.path)
+                continue
+            if entry.name.endswith(SUFFIX):
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_size:
+                break
+            remove(path)
+            total -= size
+
+    def clear(self) -> None:
+        """
+        Removes all .pplc files
+        """
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(SUFFIX):
+                remove(entry.path)
+
+
+def remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,270 @@
+import gc
+import os
+from bisect import insort
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from bytecode import Instr, Label
+
+from ..parser import Parser, ParserEngine, Token, TokenType, Position, LineIndex, TokenBuffer, EOF_TOKEN, \
+    PassManager
+from ..parser.Parser import SEMICOLON_KIND, START_KINDS, error_start
+from ..errors import PPLError
+
+# Version of the generated instructions, bump it when they change so cached programs are compiled again
+COMPILER_VERSION = 1
+
+# Token lists of at least this many tokens are compiled in a process pool by Compiler.compile()
+PARALLEL_THRESHOLD = 1 << 20
+# Minimal number of tokens compiled by one worker
+SLICE_SIZE = 1 << 15
+
+# Token types by their int values, Parser.kinds are sent to the workers instead of TokenType members
+KIND_TOKEN_TYPES = {ttype.value: ttype for ttype in TokenType}
+
+# Label number of a packed instruction that takes no argument, see pack_instructions()
+NO_ARGUMENT = -1
+
+# Line index of the code in a worker process, it is sent once when the worker starts
+worker_lines: Optional[LineIndex] = None
+
+
+def split_statements(kinds: Sequence[int], slice_size: int = SLICE_SIZE) -> Iterator[Tuple[int, int]]:
+    """
+    Splits tokens into slices of whole statements. A slice ends with a semicolon followed by a token
+    an expression starts with. The parser always starts a statement after such a semicolon,
+    even after an error, so the slices can be parsed independently
+    :param kinds: Token types as ints, the last token is EOF
+    :param slice_size: Minimal number of tokens in a slice, only the last slice may be smaller
+    :return: Iterator over start and end of the slices
+    """
+    start = 0
+    count = len(kinds) - 1
+    pos = slice_size
+    while pos < count:
+        try:
+            pos = kinds.index(SEMICOLON_KIND, pos, count) + 1
+        except ValueError:
+            break
+        if kinds[pos] in START_KINDS:
+            yield start, pos
+            start = pos
+            pos += slice_size
+    yield start, count
+
+
+def init_worker(newlines) -> None:
+    global worker_lines
+    worker_lines = LineIndex()
+    worker_lines.newlines = newlines
+    # Trees don't make reference cycles, the worker only lives as long as the compilation
+    gc.disable()
+
+
+def pack_instructions(instructions: List[Instr | Label]) -> list:
+    """
+    Instr of bytecode without an argument can't be unpickled, so workers send instructions as tuples:
+    a label as its number, an instruction as (name, argument, number of its label argument or None).
+    The label number of an instruction without an argument is NO_ARGUMENT
+    """
+    numbers: Dict[int, int] = {}
+    packed = []
+    for instr in instructions:
+        if isinstance(instr, Label):
+            packed.append(numbers.setdefault(id(instr), len(numbers)))
+        elif isinstance(instr.arg, Label):
+            packed.append((instr.name, None, numbers.setdefault(id(instr.arg), len(numbers))))
+        elif instr.require_arg():
+            packed.append((instr.name, instr.arg, None))
+        else:
+            packed.append((instr.name, None, NO_ARGUMENT))
+    return packed
+
+
+def unpack_instructions(packed: list) -> List[Instr | Label]:
+    labels: Dict[int, Label] = {}
+    instructions = []
+    for item in packed:
+        if type(item) is int:
+            instructions.append(labels.setdefault(item, Label()))
+            continue
+        name, arg, label = item
+        if label is None:
+            instructions.append(Instr(name, arg))
+        elif label == NO_ARGUMENT:
+            instructions.append(Instr(name))
+        else:
+            instructions.append(Instr(name, labels.setdefault(label, Label())))
+    return instructions
+
+
+def compile_slice(piece: Tuple[list, list, list, list, list, ParserEngine, int, Optional[List[str]]]) \
+        -> Tuple[List[Tuple[int, list]], list]:
+    """
+    Parses and compiles a slice of statements in a worker process.
+    Tokens are passed as columns and errors as tuples, so positions don't carry the line index between processes
+    :param piece: Kinds, values, lexemes, start positions and end positions of the tokens,
+                  the parser engine, max errors and the names of the optimizer passes or None
+    :return: Packed instructions of every compiled statement with the index of the token after it,
+             errors as (error class, text, (start_pos, end_pos, line, col) or None)
+    """
+    kinds, values, lexemes, starts, ends, engine, max_errors, passes = piece
+    lines = worker_lines
+    tokens = [
+        Token(KIND_TOKEN_TYPES[kind], value, lexeme, Position(start_pos, end_pos, None, None, lines))
+        for kind, value, lexeme, start_pos, end_pos in zip(kinds, values, lexemes, starts, ends)
+    ]
+    tokens.append(EOF_TOKEN)
+    optimizer = None if passes is None else PassManager(passes=passes)
+    parser = Parser(tokens, engine, max_errors, optimizer=optimizer)
+    # The parent stops at a lexer error of the slice, like the serial compilation stops at the statement of it
+    statements = [
+        (parser.pos, pack_instructions(instructions)) for instructions in Compiler(parser).iter_instructions()
+    ]
+    errors = [
+        (type(error), error.text, None) if error.position is None else
+        (type(error), error.text, (error.position.start_pos, error.position.end_pos,
+                                   error.position.line, error.position.col))
+        for error in parser.errors
+    ]
+    return statements, errors
+
+
+class CompilerOutput:
+    """
+    Output class for Compiler
+    It is returned after using Compiler.compile()
+    """
+    instructions: List[Instr]
+    errors: List[PPLError]
+
+    def __init__(self, instructions: List[Instr], errors: List[PPLError]):
+        self.instructions = instructions
+        self.errors = errors
+
+    def check_errors(self) -> bool:
+        return self.errors != []
+
+    def get_instructions(self) -> List[Instr]:
+        return self.instructions
+
+    def get_errors(self) -> List[PPLError]:
+        return self.errors
+
+
+class Compiler:
+    """
+    Compiles statements while the Parser yields them.
+    Only one statement is kept at once, it is dropped as soon as its instructions are emitted
+
+    Location "src/compiler/Compiler.py"
+    """
+    parser: Parser
+    instructions: List[Instr]
+
+    def __init__(self, parser: Parser) -> None:
+        """
+        :param parser: The parser of the code, e.g. Parser(Lexer(code))
+        """
+        self.parser = parser
+        self.instructions = []
+
+    def compile(self) -> CompilerOutput:
+        """
+        The same instructions as Parser.parse().get_result_statement().compile() produces
+        """
+        parser = self.parser
+        if parser.token_stream is None and parser.tokens_len >= PARALLEL_THRESHOLD and \
+                parser.pos == 0 and parser.spans is None:
+            return self.compile_parallel()
+
+        for instructions in self.iter_instructions():
+            self.instructions += instructions
+        return CompilerOutput(self.instructions, self.parser.errors)
+
+    def iter_instructions(self) -> Iterator[List[Instr]]:
+        """
+        Lazy version of compile(), compilation stops at the first error.
+        The rest of the code is still parsed to collect errors, up to Parser.max_errors of them
+        :return: Iterator over instructions of every statement
+        """
+        for statement in self.parser.iter_statements():
+            if not self.parser.errors:
+                yield statement.compile()
+
+    def compile_parallel(self, max_workers: Optional[int] = None, slice_size: int = SLICE_SIZE) -> CompilerOutput:
+        """
+        Splits the tokens of the parser at semicolons and parses, optimizes and compiles
+        the slices in a process pool, compile() uses it for token lists larger than PARALLEL_THRESHOLD.
+        The output is the same as the output of the serial compilation.
+        Workers run the passes of parser.optimizer, their timings aren't added to its report()
+        :param max_workers: Number of worker processes, the number of CPUs by default
+        :param slice_size: Minimal number of tokens in a slice compiled by one worker
+        """
+        parser = self.parser
+        tokens = parser.tokens
+        lines = LineIndex(tokens.source) if isinstance(tokens, TokenBuffer) else \
+            tokens[0].position.lines if parser.tokens_len else None
+        if parser.token_stream is not None or lines is None:
+            # Tokens aren't all known yet or their positions can't be rebuilt in the workers
+            for instructions in self.iter_instructions():
+                self.instructions += instructions
+            return CompilerOutput(self.instructions, parser.errors)
+
+        errors = parser.errors
+        max_errors = parser.max_errors
+        passes = None if parser.optimizer is None else parser.optimizer.names
+        kinds = parser.kinds
+        # Slices sent to the workers ahead of the slice being stitched
+        window = 2 * (max_workers or os.cpu_count() or 1)
+        slices = split_statements(kinds, slice_size)
+
+        # Columns of the slices are built from short-lived lists, collecting garbage meanwhile is wasted time
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            with ProcessPoolExecutor(max_workers, initializer=init_worker, initargs=(lines.newlines,)) as executor:
+                pending = deque()
+                while True:
+                    for start, end in slices:
+                        piece = tokens[start:end]
+                        pending.append((start, executor.submit(compile_slice, (
+                            kinds[start:end],
+                            [token.value for token in piece],
+                            [token.lexeme for token in piece],
+                            [token.position.start_pos for token in piece],
+                            [token.position.end_pos for token in piece],
+                            parser.engine,
+                            max_errors,
+                            passes
+                        ))))
+                        if len(pending) >= window:
+                            break
+                    if not pending:
+                        break
+
+                    start, future = pending.popleft()
+                    statements, slice_errors = future.result()
+                    # Compilation stops at the first error, parsing goes on up to max_errors errors.
+                    # Errors of the lexer are taken after every statement, like Parser.iter_statements() does
+                    for end, packed in statements:
+                        parser.take_lexer_errors(start + end)
+                        if errors:
+                            break
+                        self.instructions += unpack_instructions(packed)
+                    for error_class, text, position in slice_errors:
+                        insort(errors, error_class(text, None if position is None else Position(*position, lines)),
+                               key=error_start)
+                    del errors[max_errors:]
+                    if len(errors) >= max_errors:
+                        executor.shutdown(cancel_futures=True)
+                        break
+        finally:
+            if collecting:
+                gc.enable()
+
+        parser.take_lexer_errors()
+        del errors[max_errors:]
+        parser.pos = parser.tokens_len
+        return CompilerOutput(self.instructions, errors)
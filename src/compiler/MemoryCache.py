@@ -0,0 +1,106 @@
+import re
+import time
+from collections import OrderedDict
+from threading import Lock
+from types import CodeType
+from typing import Callable, Optional, Tuple
+
+# Runs of white space are one separator for the Lexer, a lexeme never holds one
+WHITESPACE = re.compile(r"[ \t\n\r\f\v]+")
+
+# Default number of programs kept by MemoryCache
+MAX_ENTRIES = 4096
+
+
+def normalize(source: str) -> str:
+    """
+    :return: The source with runs of white space replaced by one space, it is compiled to the same code
+    """
+    return WHITESPACE.sub(" ", source).strip(" ")
+
+
+class MemoryCache:
+    """
+    In-process LRU cache of compiled programs for services that compile the same code many times.
+    Programs are keyed by the normalized source and compiler flags.
+    The cache may be shared by threads, a program is built outside of the lock,
+    so a long compilation doesn't block hits of other threads
+
+    Location "src/compiler/MemoryCache.py"
+    """
+    max_entries: int
+    ttl: Optional[float]
+    entries: 'OrderedDict[Tuple[str, str], Tuple[float, CodeType]]'
+    lock: Lock
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl: Optional[float] = None) -> None:
+        """
+        :param max_entries: Number of programs kept, the least recently used one is dropped first
+        :param ttl: Seconds a program is kept after it was built or None to keep it until it is dropped
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, source: str, build: Callable[[str], CodeType], flags: str = "") -> CodeType:
+        """
+        Returns the cached program, on a miss builds it and keeps it
+        :param source: The code of the program
+        :param build: Compiles the code to a code object, e.g. with Compiler and Bytecode.to_code()
+        :param flags: Compiler flags that change the output, e.g. the optimization level
+        """
+        key = (flags, normalize(source))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires, code = entry
+                if expires >= time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return code
+                del self.entries[key]
+                self.expirations += 1
+            self.misses += 1
+
+        code = build(source)
+        expires = float("inf") if self.ttl is None else time.monotonic() + self.ttl
+        with self.lock:
+            self.entries[key] = (expires, code)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return code
+
+    def stats(self) -> dict:
+        """
+        :return: Counters of hits, misses, evictions of least recently used programs,
+                 expirations of programs older than ttl and the number of kept programs
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self.entries),
+            }
+
+    def clear(self) -> None:
+        """
+        Drops all programs, counters are kept
+        """
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,3 @@
+from .Compiler import Compiler, CompilerOutput
+from .CodeCache import CodeCache
+from .MemoryCache import MemoryCache
@@ -1,12 +1,23 @@
 from abc import ABC, abstractmethod
 
-from ..parser import Position
+from ..parser import Position, LineIndex
 
 
 class PPLError(ABC):
+    position: Position
 
     @abstractmethod
     def set_position(self, position: Position) -> None: ...
 
     @abstractmethod
     def output(self) -> str: ...
+
+    def show(self, lines: LineIndex) -> str:
+        """
+        Output with the source line of the error and a caret under the error
+        :param lines: Line index of the code
+        """
+        source_line = lines.show(self.position) if self.position is not None else None
+        if source_line is None:
+            return self.output()
+        return f"{self.output()}\n{source_line}"
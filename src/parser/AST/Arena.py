@@ -0,0 +1,341 @@
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .. import Token, TokenType, Position, LineIndex
+from . import Expression, CompilePart, OutputPart, Statement, PPLErrorExpression, ValueExpression, \
+    UnaryExpression, AdditiveExpression, MultiplicativeExpression, ShiftExpression, ConditionalExpression, \
+    EqualityExpression, BitwiseExpression, LogicalExpression, NullCoalesceExpression, TernaryExpression, \
+    ExpressionStatement
+
+from bytecode import Instr
+
+# Node classes by their kind codes in Arena.kinds
+NODE_CLASSES = [
+    ValueExpression, PPLErrorExpression, UnaryExpression, TernaryExpression,
+    AdditiveExpression, MultiplicativeExpression, ShiftExpression, ConditionalExpression,
+    EqualityExpression, BitwiseExpression, LogicalExpression, NullCoalesceExpression,
+]
+KIND_CODES = {node_class: kind for kind, node_class in enumerate(NODE_CLASSES)}
+VALUE_KIND = KIND_CODES[ValueExpression]
+ERROR_KIND = KIND_CODES[PPLErrorExpression]
+UNARY_KIND = KIND_CODES[UnaryExpression]
+TERNARY_KIND = KIND_CODES[TernaryExpression]
+
+TOKEN_TYPES = {ttype.value: ttype for ttype in TokenType}
+NO_NODE = -1
+
+
+class Arena(Statement):
+    """
+    Block of statements stored in parallel arrays instead of node objects.
+    A node is a row: kind, operator, up to three child rows, index of its literal in the pool and its position.
+    Children are always added before their parent, so optimize() folds the nodes in one pass over the rows.
+
+    Node objects are only created on demand: node() builds one node with NodeView children,
+    compile() and output() walk the views like they walk object trees
+
+    Location "src/parser/AST/Arena.py"
+    """
+    __slots__ = ("kinds", "ops", "first", "second", "third", "literal",
+                 "starts", "ends", "lines", "cols", "pool", "pool_index", "roots", "line_index")
+
+    kinds: array
+    ops: array
+    first: array
+    second: array
+    third: array
+    literal: array
+    starts: array
+    ends: array
+    lines: array
+    cols: array
+    # Literals of value nodes as (ttype, value, lexeme), prefix tokens of unary nodes
+    # as (ttype, None, lexeme) and errors as (error type, text)
+    pool: List[tuple]
+    pool_index: Dict[tuple, int]
+    roots: array
+    # Line index of the code, positions made by node() take the text of folded values from it
+    line_index: Optional[LineIndex]
+
+    @staticmethod
+    def from_statements(statements: Iterable[Statement]) -> 'Arena':
+        """
+        :param statements: Expression statements, e.g. Parser.iter_statements(optimize = False).
+                           Every statement is stored before the next one is requested
+        """
+        arena = Arena()
+        for statement in statements:
+            arena.add(statement)
+        return arena
+
+    def __init__(self) -> None:
+        self.kinds = array('B')
+        self.ops = array('B')
+        self.first = array('i')
+        self.second = array('i')
+        self.third = array('i')
+        self.literal = array('i')
+        self.starts = array('i')
+        self.ends = array('i')
+        self.lines = array('i')
+        self.cols = array('i')
+        self.pool = []
+        self.pool_index = {}
+        self.roots = array('i')
+        self.line_index = None
+
+    def add(self, statement: ExpressionStatement) -> None:
+        self.roots.append(self.add_expression(statement.expression))
+
+    def add_expression(self, expression: Expression) -> int:
+        """
+        Stores a tree, children before their parent
+        :return: Row of the root
+        """
+        rows: List[int] = []
+        # (node, children are stored), None stands for a missing child
+        stack: List[Tuple[Optional[Expression], bool]] = [(expression, False)]
+        while stack:
+            node, ready = stack.pop()
+            if node is None:
+                rows.append(NO_NODE)
+                continue
+            if not ready:
+                stack.append((node, True))
+                for child_name in reversed(node.child_names):
+                    stack.append((getattr(node, child_name), False))
+                continue
+
+            count = len(node.child_names)
+            children = rows[len(rows) - count:]
+            del rows[len(rows) - count:]
+            rows.append(self.add_node(node, children))
+        return rows[0]
+
+    def add_node(self, node: Expression, children: List[int]) -> int:
+        kind = KIND_CODES[type(node)]
+        op = 0
+        literal = NO_NODE
+        if kind == VALUE_KIND:
+            token = node.value
+            literal = self.add_literal((token.ttype, token.value, token.lexeme))
+            position = token.position
+        elif kind == ERROR_KIND:
+            literal = self.add_literal((node.error_type, node.text))
+            position = node.position
+        elif kind == UNARY_KIND:
+            token = node.optype
+            op = token.ttype.value
+            literal = self.add_literal((token.ttype, None, token.lexeme))
+            position = token.position
+        else:
+            if kind != TERNARY_KIND:
+                op = node.optype.value
+            position = None
+
+        self.kinds.append(kind)
+        self.ops.append(op)
+        self.first.append(children[0] if children else NO_NODE)
+        self.second.append(children[1] if len(children) > 1 else NO_NODE)
+        self.third.append(children[2] if len(children) > 2 else NO_NODE)
+        self.literal.append(literal)
+        if position is not None:
+            if self.line_index is None:
+                self.line_index = position.lines
+            self.starts.append(position.start_pos)
+            self.ends.append(position.end_pos)
+            self.lines.append(position.line)
+            self.cols.append(position.col)
+        else:
+            # The span of an operator node is the span of its operands
+            last = max(children)
+            self.starts.append(self.starts[children[0]])
+            self.ends.append(self.ends[last])
+            self.lines.append(self.lines[children[0]])
+            self.cols.append(self.cols[children[0]])
+        return len(self.kinds) - 1
+
+    def add_literal(self, literal: tuple) -> int:
+        index = self.pool_index.get(literal)
+        if index is None:
+            index = len(self.pool)
+            self.pool.append(literal)
+            self.pool_index[literal] = index
+        return index
+
+    def set_node(self, row: int, node: Expression) -> None:
+        """
+        Replaces a row with a value or error node, its children rows are left unused.
+        Folded literals are rarely repeated, so they are added to the pool without looking them up
+        """
+        kind = KIND_CODES[type(node)]
+        if kind == VALUE_KIND:
+            token = node.value
+            self.pool.append((token.ttype, token.value, token.lexeme))
+            position = token.position
+        else:
+            self.pool.append((node.error_type, node.text))
+            position = node.position
+        self.literal[row] = len(self.pool) - 1
+        self.kinds[row] = kind
+        self.ops[row] = 0
+        self.first[row] = NO_NODE
+        self.second[row] = NO_NODE
+        self.third[row] = NO_NODE
+        self.starts[row] = position.start_pos
+        self.ends[row] = position.end_pos
+        self.lines[row] = position.line
+        self.cols[row] = position.col
+
+    def position(self, row: int) -> Position:
+        return Position(self.starts[row], self.ends[row], self.lines[row], self.cols[row], self.line_index)
+
+    def node(self, row: int) -> Expression:
+        """
+        Creates the node of a row. Its value children are value nodes, other children are NodeViews
+        """
+        kind = self.kinds[row]
+        if kind == VALUE_KIND:
+            ttype, value, lexeme = self.pool[self.literal[row]]
+            return ValueExpression(Token(ttype, value, lexeme, self.position(row)))
+        if kind == ERROR_KIND:
+            error_type, text = self.pool[self.literal[row]]
+            return PPLErrorExpression(error_type, text, self.position(row))
+        if kind == UNARY_KIND:
+            ttype, value, lexeme = self.pool[self.literal[row]]
+            return UnaryExpression(Token(ttype, value, lexeme, self.position(row)), self.child(self.first[row]))
+        if kind == TERNARY_KIND:
+            third = self.third[row]
+            return TernaryExpression(
+                self.child(self.first[row]),
+                self.child(self.second[row]),
+                None if third == NO_NODE else self.child(third)
+            )
+        return NODE_CLASSES[kind](TOKEN_TYPES[self.ops[row]], self.child(self.first[row]), self.child(self.second[row]))
+
+    def child(self, row: int) -> Expression:
+        if self.kinds[row] == VALUE_KIND:
+            return self.node(row)
+        return NodeView(self, row)
+
+    def optimize(self) -> Statement:
+        """
+        Folds the nodes in the order they were added, so the children of a node are already folded.
+        A node is folded by the optimize_node() of its class, like in object trees
+        """
+        kinds = self.kinds
+        ops = self.ops
+        first = self.first
+        second = self.second
+        third = self.third
+        literal = self.literal
+        pool = self.pool
+        # Value nodes made by folding, by their rows. Every row has one parent, so a node is taken once
+        folded: Dict[int, Expression] = {}
+        for row in range(len(kinds)):
+            kind = kinds[row]
+            if kind == ERROR_KIND:
+                continue
+            if kind == VALUE_KIND:
+                # Only float values are changed by ValueExpression.optimize_node()
+                if pool[literal[row]][0] != TokenType.FLOAT:
+                    continue
+                node = self.node(row)
+            else:
+                # A node is only folded when all its operands are values
+                left = first[row]
+                if kinds[left] != VALUE_KIND:
+                    continue
+                right = second[row]
+                if right != NO_NODE and kinds[right] != VALUE_KIND:
+                    continue
+                if kind == TERNARY_KIND:
+                    other = third[row]
+                    if other == NO_NODE or kinds[other] != VALUE_KIND:
+                        continue
+                    node = TernaryExpression(
+                        folded.pop(left, None) or self.node(left),
+                        folded.pop(right, None) or self.node(right),
+                        folded.pop(other, None) or self.node(other)
+                    )
+                elif kind == UNARY_KIND:
+                    ttype, value, lexeme = pool[literal[row]]
+                    node = UnaryExpression(Token(ttype, value, lexeme, self.position(row)),
+                                           folded.pop(left, None) or self.node(left))
+                else:
+                    node = NODE_CLASSES[kind](TOKEN_TYPES[ops[row]],
+                                              folded.pop(left, None) or self.node(left),
+                                              folded.pop(right, None) or self.node(right))
+
+            optimized = node.optimize_node()
+            if optimized is not node:
+                self.set_node(row, optimized)
+                if type(optimized) is ValueExpression:
+                    folded[row] = optimized
+        return self
+
+    def compile(self) -> List[Instr]:
+        result: List[Instr] = []
+        for root in self.roots:
+            result += self.child(root).compile()
+        return result
+
+    def check_error(self) -> Expression | None:
+        """
+        :return: The first error node of the first statement with an error or None
+        """
+        for root in self.roots:
+            error = self.check_root(root)
+            if error is not None:
+                return error
+        return None
+
+    def check_root(self, root: int) -> Optional[PPLErrorExpression]:
+        """
+        :return: The first error node of a statement in the order of PPLErrorExpression.check_error()
+        """
+        stack = [root]
+        while stack:
+            row = stack.pop()
+            if self.kinds[row] == ERROR_KIND:
+                return self.node(row)
+            for child in (self.third[row], self.second[row], self.first[row]):
+                if child != NO_NODE:
+                    stack.append(child)
+        return None
+
+    def output(self) -> str:
+        result = "[\n"
+        for root in self.roots:
+            result += f"({self.child(root).output()})" + '\n'
+        result += ']'
+        return result
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+
+class NodeView(Expression):
+    """
+    Lightweight reference to a row of an Arena, the node itself is created when it is compiled or output
+    """
+    __slots__ = ("arena", "row")
+
+    arena: Arena
+    row: int
+
+    def __init__(self, arena: Arena, row: int) -> None:
+        self.arena = arena
+        self.row = row
+
+    def optimize_node(self) -> Expression:
+        return self
+
+    def compile_parts(self) -> List[CompilePart]:
+        return self.arena.node(self.row).compile_parts()
+
+    def check_node(self) -> Expression | None:
+        return self.arena.node(self.row).check_node()
+
+    def output_parts(self) -> List[OutputPart]:
+        return self.arena.node(self.row).output_parts()
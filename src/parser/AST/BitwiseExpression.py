@@ -1,12 +1,15 @@
 from typing import List
 
-from .. import Token, TokenType, Position
-from . import Expression, ValueExpression, ValueType, PPLErrorExpression, ErrorType
+from .. import TokenType
+from . import Expression, CompilePart, OutputPart, ValueExpression, fold_binary
 
 from bytecode import Instr, BinaryOp
 
 
 class BitwiseExpression(Expression):
+    __slots__ = ("expr1", "expr2", "optype")
+    child_names = ("expr1", "expr2")
+
     expr1: Expression
     expr2: Expression
     optype: TokenType
@@ -16,83 +19,15 @@ class BitwiseExpression(Expression):
         self.expr2 = expr2
         self.optype = optype
 
-    def optimize(self) -> Expression:
-        self.expr1 = self.expr1.optimize()
-        self.expr2 = self.expr2.optimize()
-
+    def optimize_node(self) -> Expression:
         if isinstance(self.expr1, ValueExpression) and isinstance(self.expr2, ValueExpression):
-            match (self.expr1.vtype, self.expr2.vtype):
-                case (ValueType.Integer, ValueType.Integer):
-                    match self.optype:
-                        case TokenType.AMP:
-                            return ValueExpression(
-                                Token(
-                                    TokenType.INT,
-                                    str(int(self.expr1.value.value) & int(self.expr2.value.value)),
-                                    self.expr1.value.lexeme + ' & ' + self.expr2.value.lexeme,
-                                    Position(
-                                        self.expr1.value.position.start_pos,
-                                        self.expr2.value.position.end_pos,
-                                        self.expr1.value.position.line,
-                                        self.expr1.value.position.col
-                                    )
-                                )
-                            )
-                        case TokenType.CARET:
-                            return ValueExpression(
-                                Token(
-                                    TokenType.INT,
-                                    str(int(self.expr1.value.value) ^ int(self.expr2.value.value)),
-                                    self.expr1.value.lexeme + ' ^ ' + self.expr2.value.lexeme,
-                                    Position(
-                                        self.expr1.value.position.start_pos,
-                                        self.expr2.value.position.end_pos,
-                                        self.expr1.value.position.line,
-                                        self.expr1.value.position.col
-                                    )
-                                )
-                            )
-                        case TokenType.BAR:
-                            return ValueExpression(
-                                Token(
-                                    TokenType.INT,
-                                    str(int(self.expr1.value.value) | int(self.expr2.value.value)),
-                                    self.expr1.value.lexeme + ' | ' + self.expr2.value.lexeme,
-                                    Position(
-                                        self.expr1.value.position.start_pos,
-                                        self.expr2.value.position.end_pos,
-                                        self.expr1.value.position.line,
-                                        self.expr1.value.position.col
-                                    )
-                                )
-                            )
-                    return PPLErrorExpression(
-                        ErrorType.ParserException,
-                        f"There is no implementation of {self.optype.get_name()} operator with Integer",
-                        Position(
-                            self.expr1.value.position.start_pos,
-                            self.expr2.value.position.end_pos,
-                            self.expr1.value.position.line,
-                            self.expr1.value.position.col
-                        )
-                    )
-            return PPLErrorExpression(
-                ErrorType.ParserException,
-                f"Can't use {self.expr1.vtype.name} {self.optype.get_name()} {self.expr2.vtype.name}",
-                Position(
-                    self.expr1.value.position.start_pos,
-                    self.expr2.value.position.end_pos,
-                    self.expr1.value.position.line,
-                    self.expr1.value.position.col
-                )
-            )
-
+            return fold_binary(self)
         return self
 
-    def compile(self) -> List[Instr]:
-        result: List[Instr] = []
-        result += self.expr1.compile()
-        result += self.expr2.compile()
+    def compile_parts(self) -> List[CompilePart]:
+        result: List[CompilePart] = []
+        result.append(self.expr1)
+        result.append(self.expr2)
 
         match self.optype:
             case TokenType.AMP:
@@ -104,9 +39,5 @@ class BitwiseExpression(Expression):
 
         return result
 
-    def check_error(self) -> Expression | None:
-        expr1_error = self.expr1.check_error()
-        return expr1_error if expr1_error else self.expr2.check_error()
-
-    def output(self) -> str:
-        return f"({self.expr1.output()} {self.optype.get_name()} {self.expr2.output()})"
+    def output_parts(self) -> List[OutputPart]:
+        return ["(", self.expr1, f" {self.optype.get_name()} ", self.expr2, ")"]
@@ -6,6 +6,8 @@ from bytecode import Instr
 
 
 class BlockStatement(Statement):
+    __slots__ = ("statements",)
+
     statements: List[Statement]
 
     def __init__(self, statements: List[Statement] = None):
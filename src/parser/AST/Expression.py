@@ -1,18 +1,125 @@
-from typing import List
+from typing import Callable, List, Optional, Tuple, Union
 from abc import ABC, abstractmethod
 
-from bytecode import Instr
+from bytecode import Instr, Label
 
 
 class Expression(ABC):
-    @abstractmethod
-    def optimize(self) -> 'Expression': ...
+    """
+    Base class of expression nodes.
+    optimize(), compile(), check_error() and output() walk the tree with explicit stacks,
+    so a tree of any depth is handled without recursion. Nodes only implement the step for themselves
+
+    Location "src/parser/AST/Expression.py"
+    """
+    __slots__ = ()
+
+    # Attributes that hold child expressions, in evaluation order
+    child_names: Tuple[str, ...] = ()
+
+    def optimize(self) -> 'Expression':
+        """
+        Optimizes the tree bottom-up, every node is optimized after its children
+        :return: The optimized tree
+        """
+        return self.transform(optimize_node)
+
+    def transform(self, visit: Callable[['Expression'], 'Expression']) -> 'Expression':
+        """
+        Replaces every node of the tree bottom-up, a node is visited after its children are replaced
+        :param visit: Returns the node, a new node or one of the children of the node
+        :return: The transformed tree
+        """
+        result = self
+        # (node, parent, name of the attribute of the parent that holds the node, children are visited)
+        stack = [(self, None, None, False)]
+        while stack:
+            node, parent, name, ready = stack.pop()
+            if not ready:
+                stack.append((node, parent, name, True))
+                for child_name in reversed(node.child_names):
+                    child = getattr(node, child_name)
+                    if child is not None:
+                        stack.append((child, node, child_name, False))
+                continue
+
+            visited = visit(node)
+            if parent is None:
+                result = visited
+            else:
+                setattr(parent, name, visited)
+        return result
+
+    def compile(self) -> List[Instr]:
+        """
+        :return: Instructions and labels of the tree
+        """
+        result: List[Instr] = []
+        stack: List[CompilePart] = [self]
+        while stack:
+            part = stack.pop()
+            # Expression is an ABC, isinstance() with it is much slower
+            if isinstance(part, (Instr, Label)):
+                result.append(part)
+            else:
+                stack.extend(reversed(part.compile_parts()))
+        return result
+
+    def check_error(self) -> Optional['Expression']:
+        """
+        :return: The first error expression of the tree or None
+        """
+        stack: List[Expression] = [self]
+        while stack:
+            node = stack.pop()
+            error = node.check_node()
+            if error is not None:
+                return error
+            for child_name in reversed(node.child_names):
+                child = getattr(node, child_name)
+                if child is not None:
+                    stack.append(child)
+        return None
+
+    def output(self) -> str:
+        result: List[str] = []
+        stack: List[OutputPart] = [self]
+        while stack:
+            part = stack.pop()
+            if isinstance(part, str):
+                result.append(part)
+            else:
+                stack.extend(reversed(part.output_parts()))
+        return "".join(result)
 
     @abstractmethod
-    def compile(self) -> List[Instr]: ...
+    def optimize_node(self) -> 'Expression':
+        """
+        Optimizes the node, its children are already optimized
+        """
 
     @abstractmethod
-    def check_error(self) -> 'Expression': ...
+    def compile_parts(self) -> List['CompilePart']:
+        """
+        :return: Instructions of the node with its children in the places of their code
+        """
+
+    def check_node(self) -> Optional['Expression']:
+        """
+        :return: The node if it is an error
+        """
+        return None
 
     @abstractmethod
-    def output(self) -> str: ...
+    def output_parts(self) -> List['OutputPart']:
+        """
+        :return: Text of the node with its children in the places of their text
+        """
+
+
+def optimize_node(node: Expression) -> Expression:
+    return node.optimize_node()
+
+
+CompilePart = Union[Instr, Label, Expression]
+OutputPart = Union[str, Expression]
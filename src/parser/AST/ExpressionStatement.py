@@ -6,6 +6,8 @@ from bytecode import Instr
 
 
 class ExpressionStatement(Statement):
+    __slots__ = ("expression",)
+
     expression: Expression
 
     def __init__(self, expression: Expression):
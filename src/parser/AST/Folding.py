@@ -0,0 +1,282 @@
+import math
+import operator
+from threading import Lock
+from typing import Callable, Dict, Optional, Tuple
+
+from .. import Token, TokenType, Position
+from . import Expression, ValueExpression, ValueType, PPLErrorExpression, ErrorType
+
+Integer = ValueType.Integer
+Float = ValueType.Float
+Bool = ValueType.Bool
+String = ValueType.String
+
+# Pairs of operand types folded as numbers
+NUMBERS = [(Integer, Integer), (Integer, Float), (Float, Integer), (Float, Float)]
+
+# Default limit of the estimated size of a folded value in bits, a char of a string takes 8 bits.
+# Integers under it still have less than sys.get_int_max_str_digits() digits, so they can be output
+MAX_FOLD_BITS = 1 << 13
+DIGITS_PER_BIT = math.log10(2)
+
+# Token types of numbers by the types of their values
+NUMBER_KINDS = {int: TokenType.INT, float: TokenType.FLOAT}
+
+Fold = Tuple[Optional[TokenType], Callable]
+FoldError = Tuple[ErrorType, str]
+
+
+def no_implementation(optype: TokenType, text: str) -> FoldError:
+    return ErrorType.ParserException, f"There is no implementation of {optype.get_name()} operator {text}"
+
+
+def floor_divide(left: float, right: float) -> int:
+    return int(left // right)
+
+
+def logical_and(left: bool, right: bool) -> bool:
+    return left and right
+
+
+def logical_or(left: bool, right: bool) -> bool:
+    return left or right
+
+
+# (operator, left type, right type) -> (token type of the result, function of the operand values)
+# or (error type, text of the error). Unary operators have no right type.
+# A result without a token type is a number whose type follows its value, 2 ** -1 is a float.
+# Operands of a pair that isn't in the table can't be used with the operator
+FOLDS: Dict[Tuple[TokenType, ValueType, Optional[ValueType]], Fold | FoldError] = {
+    (TokenType.PLUS, Integer, None): (TokenType.INT, operator.pos),
+    (TokenType.MINUS, Integer, None): (TokenType.INT, operator.neg),
+    (TokenType.PLUS, Float, None): (TokenType.FLOAT, operator.pos),
+    (TokenType.MINUS, Float, None): (TokenType.FLOAT, operator.neg),
+
+    (TokenType.PLUS, Integer, Integer): (TokenType.INT, operator.add),
+    (TokenType.MINUS, Integer, Integer): (TokenType.INT, operator.sub),
+    (TokenType.STAR, Integer, Integer): (TokenType.INT, operator.mul),
+    (TokenType.SLASH, Integer, Integer): (TokenType.FLOAT, operator.truediv),
+    (TokenType.PERCENT, Integer, Integer): (TokenType.INT, operator.mod),
+    (TokenType.STARSTAR, Integer, Integer): (None, operator.pow),
+    (TokenType.SLASHSLASH, Integer, Integer): (TokenType.INT, operator.floordiv),
+    (TokenType.GTGT, Integer, Integer): (TokenType.INT, operator.rshift),
+    (TokenType.LTLT, Integer, Integer): (TokenType.INT, operator.lshift),
+    (TokenType.AMP, Integer, Integer): (TokenType.INT, operator.and_),
+    (TokenType.CARET, Integer, Integer): (TokenType.INT, operator.xor),
+    (TokenType.BAR, Integer, Integer): (TokenType.INT, operator.or_),
+
+    (TokenType.AMPAMP, Bool, Bool): (TokenType.BOOL, logical_and),
+    (TokenType.BARBAR, Bool, Bool): (TokenType.BOOL, logical_or),
+    (TokenType.AND, Bool, Bool): (TokenType.BOOL, logical_and),
+    (TokenType.XOR, Bool, Bool): (TokenType.BOOL, operator.xor),
+    (TokenType.OR, Bool, Bool): (TokenType.BOOL, logical_or),
+}
+for _left, _right in NUMBERS:
+    FOLDS[TokenType.GT, _left, _right] = (TokenType.BOOL, operator.gt)
+    FOLDS[TokenType.GTEQ, _left, _right] = (TokenType.BOOL, operator.ge)
+    FOLDS[TokenType.LT, _left, _right] = (TokenType.BOOL, operator.lt)
+    FOLDS[TokenType.LTEQ, _left, _right] = (TokenType.BOOL, operator.le)
+    if Float in (_left, _right):
+        FOLDS[TokenType.PLUS, _left, _right] = (TokenType.FLOAT, operator.add)
+        FOLDS[TokenType.MINUS, _left, _right] = (TokenType.FLOAT, operator.sub)
+        FOLDS[TokenType.STAR, _left, _right] = (TokenType.FLOAT, operator.mul)
+        FOLDS[TokenType.SLASH, _left, _right] = (TokenType.FLOAT, operator.truediv)
+        FOLDS[TokenType.PERCENT, _left, _right] = (TokenType.FLOAT, operator.mod)
+        FOLDS[TokenType.STARSTAR, _left, _right] = (TokenType.FLOAT, operator.pow)
+        FOLDS[TokenType.SLASHSLASH, _left, _right] = (TokenType.INT, floor_divide)
+        FOLDS[TokenType.GTGT, _left, _right] = no_implementation(TokenType.GTGT, "with Float")
+        FOLDS[TokenType.LTLT, _left, _right] = no_implementation(TokenType.LTLT, "with Float")
+for _left in ValueType:
+    FOLDS[TokenType.PLUS, String, _left] = (TokenType.STRING, lambda left, right: left + str(right))
+    FOLDS[TokenType.MINUS, String, _left] = no_implementation(TokenType.MINUS, "for String")
+    for _right in ValueType:
+        FOLDS[TokenType.EQEQ, _left, _right] = (TokenType.BOOL, operator.eq)
+        FOLDS[TokenType.NOTEQ, _left, _right] = (TokenType.BOOL, operator.ne)
+        FOLDS[TokenType.IS, _left, _right] = \
+            (ErrorType.SyntaxWarning, f"\"is\" with '{_left.name}' literal. Did you mean \"==\"?")
+        FOLDS[TokenType.NOT, _left, _right] = \
+            (ErrorType.SyntaxWarning, f"\"is not\" with '{_left.name}' literal. Did you mean \"!=\"?")
+del _left, _right
+
+
+def int_bits(value: int) -> int:
+    return value.bit_length()
+
+
+def power_bits(left: int, right: int) -> int:
+    if type(right) is not int or right < 0 or -1 <= left <= 1:
+        # The result is a float or doesn't grow
+        return 64
+    try:
+        return int(math.log2(abs(left)) * right) + 1
+    except OverflowError:
+        # The exponent is too large for a float, the result has at least this many bits
+        return (abs(left).bit_length() - 1) * right + 1
+
+
+def shift_bits(left: int, right: int) -> int:
+    if type(right) is not int or right < 0 or left == 0:
+        # A negative count raises, so the fold fails right away
+        return 64
+    return int_bits(left) + right
+
+
+def product_bits(left: int, right: int) -> int:
+    return int_bits(left) + int_bits(right)
+
+
+def concatenation_bits(left: str, right) -> int:
+    if type(right) is int:
+        # str() of a large integer takes time quadratic in its digits
+        return (len(left) + int(right.bit_length() * DIGITS_PER_BIT) + 2) * 8
+    return (len(left) + 32) * 8
+
+
+# (operator, left type, right type) -> estimate of the size of the result in bits, see FoldBudget.
+# Results of other operations are about as large as their operands
+COSTS: Dict[Tuple[TokenType, ValueType, Optional[ValueType]], Callable[[object, object], int]] = {
+    (TokenType.STARSTAR, Integer, Integer): power_bits,
+    (TokenType.LTLT, Integer, Integer): shift_bits,
+    (TokenType.STAR, Integer, Integer): product_bits,
+}
+for _left in ValueType:
+    COSTS[TokenType.PLUS, String, _left] = concatenation_bits
+del _left
+
+
+class FoldBudget:
+    """
+    Limit of the cost of constant folding with counters of expensive folds.
+    The size of the result is estimated from the operands before folding, an operation over max_bits
+    is left to run with the program, so a line like 2 ** 99999999 can't hang the compiler.
+    An operation that raises when it is folded, like 1 / 0, also raises at runtime.
+
+    The limit is read on every fold, e.g. FOLD_BUDGET.max_bits = 1 << 20 allows larger values.
+    The counters may be read by other threads with stats()
+
+    Location "src/parser/AST/Folding.py"
+    """
+    max_bits: int
+    lock: Lock
+    estimated: int
+    deferred: int
+    failed: int
+    max_cost: int
+
+    def __init__(self, max_bits: int = MAX_FOLD_BITS) -> None:
+        """
+        :param max_bits: Limit of the estimated size of a folded value in bits
+        """
+        self.max_bits = max_bits
+        self.lock = Lock()
+        self.estimated = 0
+        self.deferred = 0
+        self.failed = 0
+        self.max_cost = 0
+
+    def allows(self, cost: int) -> bool:
+        """
+        Records the estimated cost of a fold
+        :param cost: Estimated size of the result in bits
+        :return: Whether the operation may be folded
+        """
+        with self.lock:
+            self.estimated += 1
+            if cost > self.max_cost:
+                self.max_cost = cost
+            if cost > self.max_bits:
+                self.deferred += 1
+                return False
+        return True
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failed += 1
+
+    def stats(self) -> dict:
+        """
+        :return: Counters of estimated folds, folds left to runtime over the budget,
+                 folds left to runtime because they raised and the largest estimated cost in bits
+        """
+        with self.lock:
+            return {
+                "estimated": self.estimated,
+                "deferred": self.deferred,
+                "failed": self.failed,
+                "max_cost": self.max_cost,
+            }
+
+    def reset(self) -> None:
+        with self.lock:
+            self.estimated = 0
+            self.deferred = 0
+            self.failed = 0
+            self.max_cost = 0
+
+
+FOLD_BUDGET = FoldBudget()
+
+
+def fold_binary(node: Expression) -> Expression:
+    """
+    Folds an operator with two value operands
+    :param node: Operator node with ValueExpression operands in expr1 and expr2
+    :return: The value or the error of the operation, the node itself if it is left to runtime
+    """
+    optype = node.optype
+    expr1 = node.expr1
+    expr2 = node.expr2
+    token1 = expr1.value
+    token2 = expr2.value
+    position1 = token1.position
+    # The line and column of the result are the ones of the left operand, they are found only when needed
+    position = Position(position1.start_pos, token2.position.end_pos, position1._line, position1._col,
+                        position1.lines)
+
+    key = (optype, expr1.vtype, expr2.vtype)
+    entry = FOLDS.get(key)
+    if entry is None:
+        return PPLErrorExpression(
+            ErrorType.ParserException,
+            f"Can't use {expr1.vtype.name} {optype.get_name()} {expr2.vtype.name}",
+            position
+        )
+    kind, action = entry
+    if type(kind) is ErrorType:
+        return PPLErrorExpression(kind, action, position)
+
+    estimate = COSTS.get(key)
+    if estimate is not None and not FOLD_BUDGET.allows(estimate(token1.value, token2.value)):
+        return node
+    try:
+        value = action(token1.value, token2.value)
+    except (ArithmeticError, ValueError, TypeError):
+        FOLD_BUDGET.record_failure()
+        return node
+    if kind is None:
+        kind = NUMBER_KINDS[type(value)]
+    return ValueExpression(Token(kind, value, None, position))
+
+
+def fold_unary(node: Expression) -> Expression:
+    """
+    Folds a prefix operator with a value operand
+    :param node: UnaryExpression with a ValueExpression operand
+    :return: The value or the error of the operation
+    """
+    optype = node.optype
+    token = node.expr.value
+    position = Position(optype.position.start_pos, token.position.end_pos, token.position.line, token.position.col,
+                        optype.position.lines)
+
+    entry = FOLDS.get((optype.ttype, node.expr.vtype, None))
+    if entry is None:
+        return PPLErrorExpression(
+            ErrorType.ParserException,
+            f"Can't use {optype.ttype.get_name()} {node.expr.vtype.name}",
+            position
+        )
+    kind, action = entry
+    if type(kind) is ErrorType:
+        return PPLErrorExpression(kind, action, position)
+    return ValueExpression(Token(kind, action(token.value), None, position))
@@ -1,12 +1,15 @@
 from typing import List
 
 from .. import Token, TokenType, Position
-from . import Expression, ValueExpression, ValueType, PPLErrorExpression, ErrorType
+from . import Expression, CompilePart, OutputPart, ValueExpression, ValueType, PPLErrorExpression, ErrorType
 
 from bytecode import Instr, Label, Compare
 
 
 class NullCoalesceExpression(Expression):
+    __slots__ = ("expr1", "expr2", "optype")
+    child_names = ("expr1", "expr2")
+
     expr1: Expression
     expr2: Expression
     optype: TokenType
@@ -16,10 +19,7 @@ class NullCoalesceExpression(Expression):
         self.expr2 = expr2
         self.optype = optype
 
-    def optimize(self) -> Expression:
-        self.expr1 = self.expr1.optimize()
-        self.expr2 = self.expr2.optimize()
-
+    def optimize_node(self) -> Expression:
         if isinstance(self.expr1, ValueExpression) and isinstance(self.expr2, ValueExpression):
             if self.expr1.vtype == ValueType.Null:
                 return self.expr2
@@ -28,12 +28,12 @@ class NullCoalesceExpression(Expression):
 
         return self
 
-    def compile(self) -> List[Instr]:
+    def compile_parts(self) -> List[CompilePart]:
         label_not_none = Label()
         label_end = Label()
 
-        result: List[Instr] = []
-        result += self.expr1.compile()
+        result: List[CompilePart] = []
+        result.append(self.expr1)
 
         result.append(Instr("COPY", 1))
         result.append(Instr("LOAD_CONST", None))
@@ -41,7 +41,7 @@ class NullCoalesceExpression(Expression):
         result.append(Instr("POP_JUMP_IF_FALSE", label_not_none))
 
         result.append(Instr("POP_TOP"))
-        result += self.expr2.compile()
+        result.append(self.expr2)
         result.append(Instr("JUMP_FORWARD", label_end))
 
         result.append(label_not_none)
@@ -50,9 +50,5 @@ class NullCoalesceExpression(Expression):
 
         return result
 
-    def check_error(self) -> Expression | None:
-        expr1_error = self.expr1.check_error()
-        return expr1_error if expr1_error else self.expr2.check_error()
-
-    def output(self) -> str:
-        return f"({self.expr1.output()} {self.optype.get_name()} {self.expr2.output()})"
+    def output_parts(self) -> List[OutputPart]:
+        return ["(", self.expr1, f" {self.optype.get_name()} ", self.expr2, ")"]
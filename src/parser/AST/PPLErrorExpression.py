@@ -1,7 +1,7 @@
 import enum
 from typing import List
 
-from . import Expression
+from . import Expression, CompilePart, OutputPart
 from .. import Position
 from ...errors import PPLParseException, PPLSyntaxWarning
 
@@ -20,6 +20,8 @@ def get_error_class(error_type: ErrorType):
 
 
 class PPLErrorExpression(Expression):
+    __slots__ = ("error_type", "text", "position")
+
     text: str
     position: Position
 
@@ -28,17 +30,17 @@ class PPLErrorExpression(Expression):
         self.text = text
         self.position = position
 
-    def optimize(self) -> Expression:
+    def optimize_node(self) -> Expression:
         return self
 
-    def compile(self) -> List[Instr]:
+    def compile_parts(self) -> List[CompilePart]:
         return []
 
-    def check_error(self) -> Expression | None:
+    def check_node(self) -> Expression | None:
         return self
 
     def to_exception(self) -> PPLParseException:
         return get_error_class(self.error_type)(self.text, self.position)
 
-    def output(self) -> str:
-        return PPLParseException(self.text, self.position).output()
+    def output_parts(self) -> List[OutputPart]:
+        return [PPLParseException(self.text, self.position).output()]
@@ -7,6 +7,8 @@ from bytecode import Instr
 
 
 class Statement(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def optimize(self) -> 'Statement': ...
 
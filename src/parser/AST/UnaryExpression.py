@@ -1,12 +1,15 @@
 from typing import List
 
-from .. import Token, TokenType, Position
-from . import Expression, ValueExpression, ValueType, PPLErrorExpression, ErrorType
+from .. import Token, TokenType
+from . import Expression, CompilePart, OutputPart, ValueExpression, fold_unary
 
 from bytecode import Instr, BinaryOp
 
 
 class UnaryExpression(Expression):
+    __slots__ = ("expr", "optype")
+    child_names = ("expr",)
+
     expr: Expression
     optype: Token
 
@@ -14,108 +17,14 @@ class UnaryExpression(Expression):
         self.expr = expr
         self.optype = optype
 
-    def optimize(self) -> Expression:
-        self.expr = self.expr.optimize()
-
+    def optimize_node(self) -> Expression:
         if isinstance(self.expr, ValueExpression):
-            match self.expr.vtype:
-                case ValueType.Integer:
-                    match self.optype.ttype:
-                        case TokenType.PLUS:
-                            return ValueExpression(
-                                Token(
-                                    TokenType.INT,
-                                    str(+int(self.expr.value.value)),
-                                    '+' + self.expr.value.lexeme,
-                                    Position(
-                                        self.optype.position.start_pos,
-                                        self.expr.value.position.end_pos,
-                                        self.expr.value.position.line,
-                                        self.expr.value.position.col
-                                    )
-                                )
-                            )
-                        case TokenType.MINUS:
-                            return ValueExpression(
-                                Token(
-                                    TokenType.INT,
-                                    str(-int(self.expr.value.value)),
-                                    '-' + self.expr.value.lexeme,
-                                    Position(
-                                        self.optype.position.start_pos,
-                                        self.expr.value.position.end_pos,
-                                        self.expr.value.position.line,
-                                        self.expr.value.position.col
-                                    )
-                                )
-                            )
-                    return PPLErrorExpression(
-                        ErrorType.ParserException,
-                        f"There is no implementation of {self.optype.ttype.get_name()} operator for Number",
-                        Position(
-                            self.optype.position.start_pos,
-                            self.expr.value.position.end_pos,
-                            self.expr.value.position.line,
-                            self.expr.value.position.col
-                        )
-                    )
-                case (ValueType.Float, ValueType.Float) | \
-                     (ValueType.Integer, ValueType.Float) | \
-                     (ValueType.Float, ValueType.Integer):
-                    match self.optype:
-                        case TokenType.PLUS:
-                            return ValueExpression(
-                                Token(
-                                    TokenType.FLOAT,
-                                    str(+float(self.expr.value.value)),
-                                    '+' + self.expr.value.lexeme,
-                                    Position(
-                                        self.optype.position.start_pos,
-                                        self.expr.value.position.end_pos,
-                                        self.expr.value.position.line,
-                                        self.expr.value.position.col
-                                    )
-                                )
-                            )
-                        case TokenType.MINUS:
-                            return ValueExpression(
-                                Token(
-                                    TokenType.FLOAT,
-                                    str(-float(self.expr.value.value)),
-                                    '-' + self.expr.value.lexeme,
-                                    Position(
-                                        self.optype.position.start_pos,
-                                        self.expr.value.position.end_pos,
-                                        self.expr.value.position.line,
-                                        self.expr.value.position.col
-                                    )
-                                )
-                            )
-                    return PPLErrorExpression(
-                        ErrorType.ParserException,
-                        f"There is no implementation of {self.optype.ttype.get_name()} operator for Number",
-                        Position(
-                            self.optype.position.start_pos,
-                            self.expr.value.position.end_pos,
-                            self.expr.value.position.line,
-                            self.expr.value.position.col
-                        )
-                    )
-            return PPLErrorExpression(
-                ErrorType.ParserException,
-                f"Can't use {self.optype.ttype.get_name()} {self.expr.vtype.name}",
-                Position(
-                    self.optype.position.start_pos,
-                    self.expr.value.position.end_pos,
-                    self.expr.value.position.line,
-                    self.expr.value.position.col
-                )
-            )
+            return fold_unary(self)
         return self
 
-    def compile(self) -> List[Instr]:
-        result: List[Instr] = []
-        result += self.expr.compile()
+    def compile_parts(self) -> List[CompilePart]:
+        result: List[CompilePart] = []
+        result.append(self.expr)
 
         match self.optype.ttype:
             case TokenType.MINUS:
@@ -123,8 +32,5 @@ class UnaryExpression(Expression):
 
         return result
 
-    def check_error(self) -> Expression | None:
-        return self.expr.check_error()
-
-    def output(self) -> str:
-        return f"({self.expr1.output()} {self.optype.get_name()} {self.expr2.output()})"
+    def output_parts(self) -> List[OutputPart]:
+        return ["(", self.optype.ttype.get_name(), " ", self.expr, ")"]
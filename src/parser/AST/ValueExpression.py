@@ -2,7 +2,7 @@ from enum import Enum
 from typing import List
 
 from .. import Token, TokenType
-from . import Expression
+from . import Expression, CompilePart, OutputPart
 
 from bytecode import Instr
 
@@ -14,44 +14,43 @@ class ValueType(Enum):
     String = 3
     Null = 4
 
+    # See TokenType.__hash__
+    __hash__ = object.__hash__
+
+
+# Value types of literal token types
+VALUE_TYPES = {
+    TokenType.INT: ValueType.Integer,
+    TokenType.FLOAT: ValueType.Float,
+    TokenType.BOOL: ValueType.Bool,
+    TokenType.STRING: ValueType.String,
+    TokenType.NULL: ValueType.Null,
+}
+
 
 class ValueExpression(Expression):
+    __slots__ = ("value", "vtype")
+
     value: Token
     vtype: ValueType
 
     def __init__(self, value: Token) -> None:
         self.value: Token = value
-        match value.ttype:
-            case TokenType.INT:
-                self.vtype = ValueType.Integer
-            case TokenType.FLOAT:
-                self.vtype = ValueType.Float
-            case TokenType.BOOL:
-                self.vtype = ValueType.Bool
-            case TokenType.STRING:
-                self.vtype = ValueType.String
-            case TokenType.NULL:
-                self.vtype = ValueType.Null
-
-    def optimize(self) -> Expression:
-        if self.vtype == ValueType.Float:
-            num = float(self.value.value)
-            if num == int(num):
-                self.vtype = ValueType.Integer
-                self.value.value = str(int(num))
-                self.value.ttype = TokenType.INT
+        self.vtype = VALUE_TYPES.get(value.ttype)
+
+    def optimize_node(self) -> Expression:
+        # Only literals of the code are changed, a folded value keeps the type of its operation,
+        # so folding a tree again changes nothing
+        if self.vtype == ValueType.Float and self.value.lexeme is not None and self.value.value.is_integer():
+            return ValueExpression(
+                Token(TokenType.INT, int(self.value.value), self.value.lexeme, self.value.position)
+            )
         return self
 
-    def compile(self) -> List[Instr]:
-        match self.vtype:
-            case ValueType.Integer: return [Instr("LOAD_CONST", int(self.value.value))]
-            case ValueType.Float: return [Instr("LOAD_CONST", float(self.value.value))]
-            case ValueType.Bool: return [Instr("LOAD_CONST", True if self.value.value == "True" else False)]
-            case ValueType.String: return [Instr("LOAD_CONST", self.value.value)]
-            case ValueType.Null: return [Instr("LOAD_CONST", None)]
-
-    def check_error(self) -> Expression | None:
-        return None
+    def compile_parts(self) -> List[CompilePart]:
+        return [Instr("LOAD_CONST", self.value.value)]
 
-    def output(self) -> str:
-        return f"({self.vtype.name} {self.value.value})"
+    def output_parts(self) -> List[OutputPart]:
+        if self.vtype == ValueType.Null:
+            return [f"({self.vtype.name} null)"]
+        return [f"({self.vtype.name} {self.value.value})"]
@@ -1,9 +1,10 @@
-from .Expression import Expression
+from .Expression import Expression, CompilePart, OutputPart
 from .Statement import Statement
 
 from .PPLErrorExpression import PPLErrorExpression, ErrorType
 
 from .ValueExpression import ValueExpression, ValueType
+from .Folding import FOLDS, COSTS, FoldBudget, FOLD_BUDGET, fold_binary, fold_unary
 from .AdditiveExpression import AdditiveExpression
 from .MultiplicativeExpression import MultiplicativeExpression
 from .UnaryExpression import UnaryExpression
@@ -17,3 +18,5 @@ from .TernaryExpression import TernaryExpression
 
 from .BlockStatement import BlockStatement
 from .ExpressionStatement import ExpressionStatement
+
+from .Arena import Arena, NodeView
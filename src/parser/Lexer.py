@@ -1,6 +1,16 @@
-from typing import List, Literal
-
-from . import Token, TokenType, Position
+import codecs
+import gc
+import mmap
+import os
+import re
+import sys
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from . import Token, TokenType, LiteralValue, Position, LineIndex, EOF_TOKEN
 from ..errors import *
 
 OPERATORS = "+-*/%<>&|^?!()[]{}=;:"
@@ -16,6 +26,203 @@ KEYWORDS = {
     "False": TokenType.BOOL,
     "null": TokenType.NULL,
 }
+# Values of keyword literals, other identifiers and keywords have their lexeme as a value
+KEYWORD_VALUES = {
+    "True": True,
+    "False": False,
+    "null": None,
+}
+
+# Operators that are tried first by Lexer.tokenize_operators
+FIRST_OPERATORS = {
+    "++": TokenType.PLUSPLUS,
+    "+": TokenType.PLUS,
+    "--": TokenType.MINUSMINUS,
+    "-": TokenType.MINUS,
+    "==": TokenType.EQEQ,
+    "=": TokenType.EQ,
+}
+# Operators that are tried right after them (even if the first group matched)
+SECOND_OPERATORS = {
+    "!=": TokenType.NOTEQ,
+    "!": TokenType.EXCL,
+    ">>": TokenType.GTGT,
+    ">=": TokenType.GTEQ,
+    ">": TokenType.GT,
+    "<<": TokenType.LTLT,
+    "<=": TokenType.LTEQ,
+    "<": TokenType.LT,
+    "**": TokenType.STARSTAR,
+    "*": TokenType.STAR,
+    "//": TokenType.SLASHSLASH,
+    "/": TokenType.SLASH,
+    "%": TokenType.PERCENT,
+    "&&": TokenType.AMPAMP,
+    "&": TokenType.AMP,
+    "||": TokenType.BARBAR,
+    "|": TokenType.BAR,
+    "??": TokenType.QUESTQUEST,
+    "?": TokenType.QUEST,
+    ":": TokenType.COLON,
+    ";": TokenType.SEMICOLON,
+    "^": TokenType.CARET,
+    "(": TokenType.LPAREN,
+    ")": TokenType.RPAREN,
+    "[": TokenType.LBRACE,
+    "]": TokenType.RBRACE,
+    "{": TokenType.LCURBRACE,
+    "}": TokenType.RCURBRACE,
+}
+
+# Token types with shared lexeme strings, so operator tokens don't keep a copy of their lexeme
+FIRST_OPERATOR_TOKENS = {lexeme: (ttype, lexeme) for lexeme, ttype in FIRST_OPERATORS.items()}
+SECOND_OPERATOR_TOKENS = {lexeme: (ttype, lexeme) for lexeme, ttype in SECOND_OPERATORS.items()}
+
+
+def _alternation(operators) -> str:
+    return "|".join(re.escape(operator) for operator in sorted(operators, key=len, reverse=True))
+
+
+# Extent of a number literal: 0x/0o/0b prefixed integers and decimals with an optional exponent.
+# Underscores may go anywhere after the first digit, extra dots are reported by number_value()
+NUMBER = (
+    r"0[xX][0-9A-Fa-f_]*|0[oO][0-7_]*|0[bB][01_]*"
+    r"|[0-9][0-9._]*(?:[eE][+-]?[0-9][0-9_]*)?"
+)
+NUMBER_PATTERN = re.compile(NUMBER)
+# Bases of prefixed integers
+RADIXES = {
+    'x': (16, "hexadecimal"),
+    'o': (8, "octal"),
+    'b': (2, "binary"),
+}
+
+# One pattern that recognizes every lexeme of the language.
+# The groups are tried in order, so the operator group only gets characters from OPERATORS.
+MASTER_PATTERN = re.compile(
+    r"(?P<skip>[^0-9A-Za-z_" + re.escape(OPERATORS) + r"\x80-\U0010FFFF]+)"
+    r"|(?P<number>" + NUMBER + r")"
+    r"|(?P<identifier>[A-Za-z_][0-9A-Za-z_]*)"
+    r"|(?P<other>[\x80-\U0010FFFF])"
+    r"|(?P<operator>(?P<first>" + _alternation(FIRST_OPERATORS) + r")?"
+    r"(?P<second>" + _alternation(SECOND_OPERATORS) + r")?)"
+)
+
+
+def number_value(lexeme: str) -> Tuple[TokenType, LiteralValue, Optional[str]]:
+    """
+    Converts a number literal matched by NUMBER_PATTERN
+    :param lexeme: The literal
+    :return: Token type, value and an error text (the value is None if there is an error)
+    """
+    digits = lexeme.replace('_', '') if '_' in lexeme else lexeme
+    if len(digits) > 1 and digits[0] == '0' and digits[1] in "xXoObB":
+        base, name = RADIXES[digits[1].lower()]
+        if len(digits) == 2:
+            return TokenType.INT, None, f"invalid {name} literal"
+        return TokenType.INT, int(digits[2:], base), None
+
+    dots = digits.count('.')
+    if dots > 1:
+        return TokenType.FLOAT, None, "invalid syntax. Perhaps you forgot a comma?"
+    if dots or 'e' in digits or 'E' in digits:
+        return TokenType.FLOAT, float(digits), None
+    try:
+        return TokenType.INT, int(digits), None
+    except ValueError:
+        # Decimal literals over sys.get_int_max_str_digits() digits can't be converted
+        return TokenType.INT, None, f"integer literal is too long, the limit is {sys.get_int_max_str_digits()} digits"
+
+
+# Chars after a lexeme that a match may look at: a number reads up to "e+0" before it decides
+# that there is no exponent, the second operator of a pair ends up to two chars after its position
+TOKEN_REACH = 4
+
+# Size in bytes of the chunks Lexer.from_file() decodes at once
+CHUNK_SIZE = 1 << 20
+
+
+def decode_chunks(chunks: Iterable[str | bytes], encoding: str = "utf-8") -> Iterator[str]:
+    """
+    Decodes byte chunks incrementally, a character split between two chunks is decoded once it is complete.
+    Str chunks are passed as they are
+    :param chunks: Chunks of the source
+    :param encoding: Encoding of byte chunks
+    :return: Iterator over str chunks
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            yield chunk
+        else:
+            yield decoder.decode(chunk)
+    yield decoder.decode(b"", True)
+
+
+def read_mapped_file(path: str | os.PathLike, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Reads a file through mmap, chunk by chunk
+    :param path: Path to the file
+    :param chunk_size: Size of a chunk in bytes
+    :return: Iterator over byte chunks
+    """
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for start in range(0, len(mapped), chunk_size):
+                yield mapped[start:start + chunk_size]
+
+
+# Sources of at least this many chars are lexed in a process pool by Lexer.tokenize()
+PARALLEL_THRESHOLD = 1 << 22
+# Size in chars of the pieces lexed by one worker
+PIECE_SIZE = 1 << 20
+
+
+def split_at_newlines(chunks: Iterable[str], piece_size: int = PIECE_SIZE) -> Iterator[Tuple[int, str]]:
+    """
+    Joins and splits chunks of the source into pieces that end with a new line char.
+    No token spans a new line char, so the pieces can be lexed independently
+    :param chunks: Str chunks of the source
+    :param piece_size: Minimal size of a piece, only the last piece may be smaller
+    :return: Iterator over positions of the pieces in the source and the pieces
+    """
+    base = 0
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while len(buffer) - start >= piece_size:
+            cut = buffer.find('\n', start + piece_size - 1)
+            if cut == -1:
+                break
+            yield base, buffer[start:cut + 1]
+            base += cut + 1 - start
+            start = cut + 1
+        buffer = buffer[start:]
+
+    if buffer:
+        yield base, buffer
+
+
+def scan_piece(piece: Tuple[int, str], max_errors: int = 1) -> Tuple[list, List[Tuple[str, int, int]], int]:
+    """
+    Lexes a piece of the source in a worker process.
+    Tokens are returned as tuples, so positions don't carry the line index between processes
+    :param piece: Position of the piece in the source and the piece
+    :param max_errors: The scan of the piece stops at this error
+    :return: Tokens as (ttype, value, lexeme, start_pos, end_pos), errors as (text, start_pos, end_pos)
+             and the position the scan stopped at
+    """
+    base, text = piece
+    lexer = Lexer("", max_errors=max_errors)
+    tokens = [
+        (token.ttype, token.value, token.lexeme, token.position.start_pos, token.position.end_pos)
+        for token in lexer.scan_buffer(text, base, True)
+    ]
+    errors = [(error.text, error.position.start_pos, error.position.end_pos) for error in lexer.errors]
+    return tokens, errors, lexer.pos
 
 
 def is_number(s: str) -> bool:
@@ -43,10 +250,12 @@ class LexerOutput:
     """
     tokens: List[Token]
     errors: List[PPLError]
+    lines: LineIndex
 
-    def __init__(self, tokens: List[Token], errors: List[PPLError]):
+    def __init__(self, tokens: List[Token], errors: List[PPLError], lines: LineIndex = None):
         self.tokens = tokens
         self.errors = errors
+        self.lines = lines
 
     def check_errors(self) -> bool:
         return self.errors != []
@@ -57,167 +266,441 @@ class LexerOutput:
     def get_errors(self) -> List[PPLError]:
         return self.errors
 
+    def get_lines(self) -> LineIndex:
+        return self.lines
+
+
+class LexerEngine(Enum):
+    """
+    The scanner used by Lexer.tokenize().
+    Both engines produce the same tokens, Classic is kept as the reference implementation
+    """
+    Classic = 0
+    Regex = 1
+
 
 class Lexer:
     tokens: List[Token]
     errors: List[PPLError]
+    source: Iterable[str]
+    lines: LineIndex
     code: str
     code_len: int
+    source_size: int
     pos: int
-    line: int
-    col: int
+    engine: LexerEngine
+    max_errors: int
 
-    def __init__(self, code: str, tokens = None) -> None:
+    def __init__(self, code: str, tokens = None, engine: LexerEngine = LexerEngine.Regex,
+                 lines: LineIndex = None, max_errors: int = 1) -> None:
+        """
+        :param code: The code
+        :param tokens: List the tokens are added to
+        :param engine: The scanner
+        :param lines: Line index of the code if it is already built
+        :param max_errors: The scan stops at this error. Before it a bad lexeme is reported and skipped
+        """
         if tokens is None:
             tokens = []
         self.code = code
         self.code_len = len(code)
+        self.source_size = self.code_len
         self.pos = 0
-        self.line = 1
-        self.col = 1
         self.tokens = tokens
         self.errors = []
+        self.engine = engine
+        self.max_errors = max_errors
+        self.source = (code,)
+        self.lines = LineIndex(code) if lines is None else lines
+
+    @staticmethod
+    def from_chunks(chunks: Iterable[str | bytes], encoding: str = "utf-8", max_errors: int = 1) -> 'Lexer':
+        """
+        Creates a Lexer that reads the source chunk by chunk (e.g. from a pipe or stdin).
+        Positions are the same as if the joined source was passed to Lexer()
+        :param chunks: Str chunks or byte chunks of the source
+        :param encoding: Encoding of byte chunks
+        :param max_errors: The scan stops at this error
+        """
+        lexer = Lexer("", max_errors=max_errors)
+        lexer.source_size = 0
+        lexer.lines = LineIndex()
+        lexer.source = lexer.lines.add_chunks(decode_chunks(chunks, encoding))
+        return lexer
+
+    @staticmethod
+    def from_file(path: str | os.PathLike, encoding: str = "utf-8", chunk_size: int = CHUNK_SIZE,
+                  max_errors: int = 1) -> 'Lexer':
+        """
+        Creates a Lexer that reads a memory-mapped file, the whole file is never decoded at once
+        :param path: Path to the file
+        :param encoding: Encoding of the file
+        :param chunk_size: Size in bytes of the chunks decoded at once
+        :param max_errors: The scan stops at this error
+        """
+        lexer = Lexer.from_chunks(read_mapped_file(path, chunk_size), encoding, max_errors)
+        lexer.source_size = os.stat(path).st_size
+        return lexer
+
+    @staticmethod
+    def relex(previous: LexerOutput, old_code: str, new_code: str, start: int, end: int,
+              max_errors: int = 1) -> LexerOutput:
+        """
+        Lexes the code again after an edit. Only the tokens around the edit are scanned,
+        the scan stops as soon as it reaches a token of the previous output again.
+        The previous output is taken over: its token list, positions and line index are updated in place
+        :param previous: Output of tokenize() for the old code
+        :param old_code: The code before the edit
+        :param new_code: The code after the edit
+        :param start: Start of the edited range in the old code
+        :param end: End of the edited range in the old code,
+                    it is replaced by new_code[start:end + len(new_code) - len(old_code)]
+        :param max_errors: The scan stops at this error
+        """
+        tokens = previous.tokens
+        lines = previous.lines
+        if previous.errors or lines is None:
+            # Tokens of bad lexemes are missing, the edit may turn them into good ones
+            return Lexer(new_code, max_errors=max_errors).tokenize()
+
+        delta = len(new_code) - len(old_code)
+        new_end = end + delta
+        # The last token is EOF
+        count = len(tokens) - 1
+        moved = lines.replace(new_code, start, end, new_end)
+
+        # A token depends on the chars up to TOKEN_REACH after its lexeme, so the scan restarts
+        # at the first token that could see the edit. The second operator of a pair shares
+        # the position of the first one, so the scan can only restart at the first one
+        i = bisect_left(tokens, start, 0, count, key=lambda token: token.position.start_pos)
+        while i > 0 and (
+                tokens[i - 1].position.start_pos + len(tokens[i - 1].lexeme) + TOKEN_REACH >= start or
+                i < count and tokens[i - 1].position.start_pos == tokens[i].position.start_pos
+        ):
+            i -= 1
+        restart = min(tokens[i].position.start_pos, start) if i < count else start
+
+        lexer = Lexer(new_code, lines=lines, max_errors=max_errors)
+        scanned = []
+        k = i
+        for token in lexer.scan_buffer(new_code, 0, True, restart):
+            pos = token.position.start_pos
+            if pos >= new_end:
+                # The code after the edit is the same, so the tokens are the same
+                # once a match starts where a match of the previous scan started
+                old_pos = pos - delta
+                while k < count and tokens[k].position.start_pos < old_pos:
+                    k += 1
+                if k < count and tokens[k].position.start_pos == old_pos and \
+                        (k == 0 or tokens[k - 1].position.start_pos != old_pos):
+                    break
+            scanned.append(token)
+        else:
+            k = count
+
+        if delta or moved:
+            for index in range(k, count):
+                tokens[index].position.move(delta)
+        if lexer.is_stopped():
+            # The scan stopped at the error, like the full scan does
+            tokens[i:] = scanned
+            tokens.append(EOF_TOKEN)
+        else:
+            tokens[i:k] = scanned
+        return LexerOutput(tokens, lexer.errors, lines)
 
     def tokenize(self) -> LexerOutput:
-        while not self.is_at_end() and self.errors == []:
-            current: str = self.peek()
-            if current in OPERATORS:
-                self.tokenize_operators()
-            elif is_number(current):
-                self.tokenize_digit()
-            elif current.isidentifier():
-                self.tokenize_identifier()
-            else:
-                # TODO!!! WARNS
-                # if current not in '\n\t\r ':
-                #     self.errors.append(
-                #         PPLSyntaxError("invalid syntax", Position.from3(start_pos, self.line, start_col))
-                #     )
-                current = self.next()
+        if self.engine == LexerEngine.Regex and self.source_size >= PARALLEL_THRESHOLD:
+            return self.tokenize_parallel()
+
+        self.tokens.extend(self.iter_tokens())
+        return LexerOutput(self.tokens, self.errors, self.lines)
+
+    def tokenize_parallel(self, max_workers: Optional[int] = None, piece_size: int = PIECE_SIZE) -> LexerOutput:
+        """
+        Lexes the source in a process pool, tokenize() uses it for sources larger than PARALLEL_THRESHOLD.
+        The output is the same as the output of the serial scan
+        :param max_workers: Number of worker processes, the number of CPUs by default
+        :param piece_size: Size in chars of the pieces lexed by one worker
+        """
+        # Stitched tokens don't make reference cycles, collecting garbage while millions of them
+        # are created would take longer than the scan itself
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            self.tokens.extend(self.scan_parallel(max_workers, piece_size))
+        finally:
+            if collecting:
+                gc.enable()
+        self.tokens.append(EOF_TOKEN)
+        return LexerOutput(self.tokens, self.errors, self.lines)
+
+    def iter_tokens(self) -> Iterator[Token]:
+        """
+        Lazy version of tokenize(), tokens are scanned only when they are requested.
+        Errors are collected in Lexer.errors, the last token is always EOF
+        :return: Iterator over tokens
+        """
+        if self.engine == LexerEngine.Regex:
+            yield from self.scan_regex()
+        else:
+            yield from self.scan_classic()
+
+        yield EOF_TOKEN
 
-        self.add_eof()
-        return LexerOutput(self.tokens, self.errors)
+    def scan_regex(self) -> Iterator[Token]:
+        """
+        Scans the source with MASTER_PATTERN, one match per lexeme.
+        Chunks of the source are joined only around lexemes that cross a chunk border
+        """
+        source, self.source = self.source, ()
+        base = self.pos
+        buffer = ""
+        for chunk in source:
+            buffer = buffer[self.pos - base:] + chunk
+            base = self.pos
+            yield from self.scan_buffer(buffer, base, False)
+            if self.is_stopped():
+                return
+
+        yield from self.scan_buffer(buffer[self.pos - base:], self.pos, True)
+
+    def scan_parallel(self, max_workers: Optional[int], piece_size: int) -> Iterator[Token]:
+        """
+        Splits the source at new line chars and scans the pieces in worker processes.
+        Pieces are stitched in order, the scan stops at the last allowed error like the serial scan does
+        """
+        max_errors = self.max_errors
+        source, self.source = self.source, ()
+        lines = self.lines
+        # Pieces sent to the workers ahead of the piece being stitched, so the source isn't read at once
+        window = 2 * (max_workers or os.cpu_count() or 1)
+
+        with ProcessPoolExecutor(max_workers) as executor:
+            pending = deque()
+            pieces = split_at_newlines(source, piece_size)
+            while True:
+                for piece in pieces:
+                    pending.append(executor.submit(scan_piece, piece, max_errors))
+                    if len(pending) >= window:
+                        break
+                if not pending:
+                    return
+
+                tokens, errors, self.pos = pending.popleft().result()
+                # The piece may hold more errors than are left, then the scan stops in the middle of it
+                errors = errors[:max_errors - len(self.errors)]
+                stopped = len(self.errors) + len(errors) >= max_errors
+                stop_pos = errors[-1][1] if stopped else self.pos
+                for ttype, value, lexeme, start_pos, end_pos in tokens:
+                    if start_pos >= stop_pos:
+                        break
+                    yield Token(ttype, value, lexeme, Position(start_pos, end_pos, None, None, lines))
+                for text, start_pos, end_pos in errors:
+                    self.errors.append(PPLSyntaxError(text, Position(start_pos, end_pos, None, None, lines)))
+                if stopped:
+                    self.pos = errors[-1][2]
+                    executor.shutdown(cancel_futures=True)
+                    return
+
+    def scan_buffer(self, buffer: str, base: int, final: bool, start: int = 0) -> Iterator[Token]:
+        """
+        Scans a part of the source.
+        Positions only get the line index, line and column are found in it when they are needed
+        :param buffer: The part of the source
+        :param base: Position of the buffer in the source
+        :param final: False if the source continues after the buffer.
+                      Then a lexeme that touches the end of the buffer is left for the next call
+        :param start: Position in the buffer where a lexeme starts to scan from
+        """
+        buffer_len = len(buffer)
+        match_at = MASTER_PATTERN.match
+        lines = self.lines
+        i = start
+
+        while i < buffer_len:
+            m = match_at(buffer, i)
+            kind = m.lastgroup
+            end = m.end()
+            pos = base + i
+
+            if kind == "skip":
+                pass
+            elif not final and (end == buffer_len or kind == "number" and end + 3 > buffer_len):
+                # The lexeme may continue in the next chunk, a number exponent needs up to three more chars
+                break
+            elif kind == "operator":
+                first = m.group("first")
+                second = m.group("second")
+                if first is not None:
+                    ttype, first = FIRST_OPERATOR_TOKENS[first]
+                    yield Token(
+                        ttype, None, first,
+                        Position(pos, pos + 2 if len(first) == 2 else pos, None, None, lines)
+                    )
+                if second is not None:
+                    ttype, second = SECOND_OPERATOR_TOKENS[second]
+                    yield Token(
+                        ttype, None, second,
+                        Position(pos, base + end if len(second) == 2 else pos, None, None, lines)
+                    )
+            elif kind == "number":
+                lexeme = m.group()
+                ttype, value, error = number_value(lexeme)
+                position = Position(pos, base + end, None, None, lines)
+                if error is not None:
+                    self.errors.append(PPLSyntaxError(error, position))
+                    if self.is_stopped():
+                        i = end
+                        break
+                else:
+                    yield Token(ttype, value, lexeme, position)
+            elif kind == "identifier" or kind == "other" and m.group().isidentifier():
+                if kind == "other" or end < buffer_len and buffer[end] >= '\x80':
+                    while end < buffer_len and is_identifier_part(buffer[end]):
+                        end += 1
+                    if end == buffer_len and not final:
+                        break
+                lexeme = buffer[i:end]
+                yield Token(
+                    KEYWORDS.get(lexeme, TokenType.IDENTIFIER),
+                    KEYWORD_VALUES.get(lexeme, lexeme),
+                    lexeme,
+                    Position(pos, base + end, None, None, lines)
+                )
+
+            i = end
+
+        self.pos = base + i
+
+    def scan_classic(self) -> Iterator[Token]:
+        """
+        Scans the code character by character.
+        Lexer.tokens is used as a scratch list, tokens are yielded after every scanned lexeme
+        """
+        tokens = self.tokens
+        self.tokens = []
+        try:
+            while not self.is_at_end() and not self.is_stopped():
+                self.scan_classic_lexeme()
+                if self.tokens:
+                    yield from self.tokens
+                    self.tokens.clear()
+        finally:
+            self.tokens = tokens
+
+    def scan_classic_lexeme(self) -> None:
+        current: str = self.peek()
+        if current in OPERATORS:
+            self.tokenize_operators()
+        elif is_number(current):
+            self.tokenize_digit()
+        elif current.isidentifier():
+            self.tokenize_identifier()
+        else:
+            # TODO!!! WARNS
+            # if current not in '\n\t\r ':
+            #     self.errors.append(
+            #         PPLSyntaxError("invalid syntax", Position.from3(start_pos, self.line, start_col))
+            #     )
+            current = self.next()
 
     def tokenize_operators(self) -> None:
         start_pos = self.pos
-        start_col = self.col
-        line = self.line
 
         if self.match('+'):
             if self.match('+'):
-                self.add_token(TokenType.PLUSPLUS, "++", Position(start_pos, self.pos, line, start_col))
+                self.add_token(TokenType.PLUSPLUS, "++", self.position(start_pos, self.pos))
             else:
-                self.add_token(TokenType.PLUS, "+", Position.from3(start_pos, line, start_col))
+                self.add_token(TokenType.PLUS, "+", self.position(start_pos, start_pos))
         elif self.match('-'):
             if self.match('-'):
-                self.add_token(TokenType.MINUSMINUS, "--", Position(start_pos, self.pos, line, start_col))
+                self.add_token(TokenType.MINUSMINUS, "--", self.position(start_pos, self.pos))
             else:
-                self.add_token(TokenType.MINUS, "-", Position.from3(start_pos, line, start_col))
+                self.add_token(TokenType.MINUS, "-", self.position(start_pos, start_pos))
         elif self.match('='):
             if self.match('='):
-                self.add_token(TokenType.EQEQ, "==", Position(start_pos, self.pos, line, start_col))
+                self.add_token(TokenType.EQEQ, "==", self.position(start_pos, self.pos))
             else:
-                self.add_token(TokenType.EQ, "=", Position.from3(start_pos, line, start_col))
+                self.add_token(TokenType.EQ, "=", self.position(start_pos, start_pos))
         if self.match('!'):
             if self.match('='):
-                self.add_token(TokenType.NOTEQ, "!=", Position(start_pos, self.pos, line, start_col))
+                self.add_token(TokenType.NOTEQ, "!=", self.position(start_pos, self.pos))
             else:
-                self.add_token(TokenType.EXCL, "!", Position.from3(start_pos, line, start_col))
+                self.add_token(TokenType.EXCL, "!", self.position(start_pos, start_pos))
         elif self.match('>'):
             if self.match('>'):
-                self.add_token(TokenType.GTGT, ">>", Position(start_pos, self.pos, line, start_col))
+                self.add_token(TokenType.GTGT, ">>", self.position(start_pos, self.pos))
             elif self.match('='):
-                self.add_token(TokenType.GTEQ, ">=", Position(start_pos, self.pos, line, start_col))
+                self.add_token(TokenType.GTEQ, ">=", self.position(start_pos, self.pos))
             else:
-                self.add_token(TokenType.GT, ">", Position.from3(start_pos, line, start_col))
+                self.add_token(TokenType.GT, ">", self.position(start_pos, start_pos))
         elif self.match('<'):
             if self.match('<'):
-                self.add_token(TokenType.LTLT, "<<", Position(start_pos, self.pos, line, start_col))
+                self.add_token(TokenType.LTLT, "<<", self.position(start_pos, self.pos))
             elif self.match('='):
-                self.add_token(TokenType.LTEQ, "<=", Position(start_pos, self.pos, line, start_col))
+                self.add_token(TokenType.LTEQ, "<=", self.position(start_pos, self.pos))
             else:
-                self.add_token(TokenType.LT, "<", Position.from3(start_pos, line, start_col))
+                self.add_token(TokenType.LT, "<", self.position(start_pos, start_pos))
         elif self.match('*'):
             if self.match('*'):
-                self.add_token(TokenType.STARSTAR, "**", Position(start_pos, self.pos, line, start_col))
+                self.add_token(TokenType.STARSTAR, "**", self.position(start_pos, self.pos))
             else:
-                self.add_token(TokenType.STAR, "*", Position.from3(start_pos, line, start_col))
+                self.add_token(TokenType.STAR, "*", self.position(start_pos, start_pos))
         elif self.match('/'):
             if self.match('/'):
-                self.add_token(TokenType.SLASHSLASH, "//", Position(start_pos, self.pos, line, start_col))
+                self.add_token(TokenType.SLASHSLASH, "//", self.position(start_pos, self.pos))
             else:
-                self.add_token(TokenType.SLASH, "/", Position.from3(start_pos, line, start_col))
+                self.add_token(TokenType.SLASH, "/", self.position(start_pos, start_pos))
         elif self.match('%'):
-            self.add_token(TokenType.PERCENT, "%", Position.from3(start_pos, line, start_col))
+            self.add_token(TokenType.PERCENT, "%", self.position(start_pos, start_pos))
         elif self.match('&'):
             if self.match('&'):
-                self.add_token(TokenType.AMPAMP, "&&", Position(start_pos, self.pos, line, start_col))
+                self.add_token(TokenType.AMPAMP, "&&", self.position(start_pos, self.pos))
             else:
-                self.add_token(TokenType.AMP, "&", Position.from3(start_pos, line, start_col))
+                self.add_token(TokenType.AMP, "&", self.position(start_pos, start_pos))
         elif self.match('|'):
             if self.match('|'):
-                self.add_token(TokenType.BARBAR, "||", Position(start_pos, self.pos, line, start_col))
+                self.add_token(TokenType.BARBAR, "||", self.position(start_pos, self.pos))
             else:
-                self.add_token(TokenType.BAR, "|", Position.from3(start_pos, line, start_col))
+                self.add_token(TokenType.BAR, "|", self.position(start_pos, start_pos))
         elif self.match('?'):
             if self.match('?'):
-                self.add_token(TokenType.QUESTQUEST, "??", Position(start_pos, self.pos, line, start_col))
+                self.add_token(TokenType.QUESTQUEST, "??", self.position(start_pos, self.pos))
             else:
-                self.add_token(TokenType.QUEST, "?", Position.from3(start_pos, line, start_col))
+                self.add_token(TokenType.QUEST, "?", self.position(start_pos, start_pos))
         elif self.match(':'):
-            self.add_token(TokenType.COLON, ":", Position.from3(start_pos, line, start_col))
+            self.add_token(TokenType.COLON, ":", self.position(start_pos, start_pos))
         elif self.match(';'):
-            self.add_token(TokenType.SEMICOLON, ";", Position.from3(start_pos, line, start_col))
+            self.add_token(TokenType.SEMICOLON, ";", self.position(start_pos, start_pos))
         elif self.match('^'):
-            self.add_token(TokenType.CARET, "^", Position.from3(start_pos, line, start_col))
+            self.add_token(TokenType.CARET, "^", self.position(start_pos, start_pos))
         elif self.match('('):
-            self.add_token(TokenType.LPAREN, "(", Position.from3(start_pos, line, start_col))
+            self.add_token(TokenType.LPAREN, "(", self.position(start_pos, start_pos))
         elif self.match(')'):
-            self.add_token(TokenType.RPAREN, ")", Position.from3(start_pos, line, start_col))
+            self.add_token(TokenType.RPAREN, ")", self.position(start_pos, start_pos))
         elif self.match('['):
-            self.add_token(TokenType.LBRACE, "[", Position.from3(start_pos, line, start_col))
+            self.add_token(TokenType.LBRACE, "[", self.position(start_pos, start_pos))
         elif self.match(']'):
-            self.add_token(TokenType.RBRACE, "]", Position.from3(start_pos, line, start_col))
+            self.add_token(TokenType.RBRACE, "]", self.position(start_pos, start_pos))
         elif self.match('{'):
-            self.add_token(TokenType.LCURBRACE, "{", Position.from3(start_pos, line, start_col))
+            self.add_token(TokenType.LCURBRACE, "{", self.position(start_pos, start_pos))
         elif self.match('}'):
-            self.add_token(TokenType.RCURBRACE, "}", Position.from3(start_pos, line, start_col))
+            self.add_token(TokenType.RCURBRACE, "}", self.position(start_pos, start_pos))
 
     def tokenize_digit(self) -> None:
         start_pos = self.pos
-        start_col = self.col
-        current = self.peek()
-        builder = ""
-        has_dot = False
-        error = None
-        while True:
-            if current == '.':
-                if has_dot:
-                    if error is None:
-                        error = PPLSyntaxError("invalid syntax. Perhaps you forgot a comma?")
-                has_dot = True
-            elif current == '_':
-                current = self.next()
-                continue
-            elif not is_number(current):
-                break
-            builder += current
-            current = self.next()
+        self.pos = NUMBER_PATTERN.match(self.code, start_pos).end()
+        lexeme = self.code[start_pos:self.pos]
 
+        ttype, value, error = number_value(lexeme)
         if error is not None:
-            error.set_position(Position(start_pos, self.pos, self.line - self.line_offset(), start_col))
-            self.errors.append(error)
+            self.errors.append(PPLSyntaxError(error, self.position(start_pos, self.pos)))
         else:
-            self.add_full_token(
-                TokenType.FLOAT if has_dot else TokenType.INT,
-                builder,
-                self.code[start_pos:self.pos],
-                Position(start_pos, self.pos, self.line - self.line_offset(), start_col)
-            )
+            self.add_full_token(ttype, value, lexeme, self.position(start_pos, self.pos))
 
     def tokenize_identifier(self) -> None:
         start_pos = self.pos
-        start_col = self.col
         current = self.peek()
         builder = ""
 
@@ -230,17 +713,16 @@ class Lexer:
 
         self.add_full_token(
             KEYWORDS[builder] if builder in KEYWORDS else TokenType.IDENTIFIER,
-            builder,
+            KEYWORD_VALUES.get(builder, builder),
             self.code[start_pos:self.pos],
-            Position(start_pos, self.pos, self.line - self.line_offset(), start_col)
+            self.position(start_pos, self.pos)
         )
 
-    def line_offset(self) -> Literal[0, 1]:
+    def position(self, start_pos: int, end_pos: int) -> Position:
         """
-        Returns an offset if peeked character is a new line char
-        :return: Offset 0 or 1
+        :return: Position which line and column are found in the line index when they are needed
         """
-        return 0 if self.peek() != '\n' else 1
+        return Position(start_pos, end_pos, None, None, self.lines)
 
     def match(self, char: str) -> bool:
         if self.peek() == char:
@@ -250,13 +732,7 @@ class Lexer:
 
     def next(self) -> str:
         self.pos += 1
-        char: str = self.peek()
-        if char == '\n':
-            self.line += 1
-            self.col = 0
-        else:
-            self.col += 1
-        return char
+        return self.peek()
 
     def peek(self, relative: int = 0) -> str:
         if self.is_at_end(relative):
@@ -264,14 +740,20 @@ class Lexer:
 
         return self.code[self.pos + relative]
 
+    def is_stopped(self) -> bool:
+        """
+        :return: True if the scan has reached max_errors errors
+        """
+        return len(self.errors) >= self.max_errors
+
     def is_at_end(self, relative: int = 0) -> bool:
         return self.pos + relative >= self.code_len
 
-    def add_full_token(self, ttype: TokenType, value: str, lexeme: str, position: Position) -> None:
+    def add_full_token(self, ttype: TokenType, value: LiteralValue, lexeme: str, position: Position) -> None:
         self.tokens.append(Token(ttype, value, lexeme, position))
 
     def add_token(self, ttype: TokenType, lexeme: str, position: Position) -> None:
         self.tokens.append(Token.from3(ttype, lexeme, position))
 
     def add_eof(self) -> None:
-        self.tokens.append(Token.from3(TokenType.EOF, "EOF", Position(-1, -1, -1, -1)))
+        self.tokens.append(EOF_TOKEN)
@@ -0,0 +1,125 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterable, Iterator, Optional, Tuple
+
+from . import Position
+
+
+class LineIndex:
+    """
+    Offsets of the new line chars of the code.
+    Line and column of a position are found by bisecting them, so the Lexer doesn't track them.
+
+    A new line char at offset 0 doesn't start a line, as it always was in Lexer.
+
+    Location "src/parser/LineIndex.py"
+    """
+    newlines: array
+    code: Optional[str]
+
+    def __init__(self, code: Optional[str] = None) -> None:
+        """
+        :param code: The code to index. It is kept to show source lines
+        """
+        self.newlines = array('i')
+        self.code = code
+        if code:
+            self.add(code, 0)
+
+    def add(self, text: str, base: int) -> None:
+        """
+        Indexes a part of the code, parts must be added in order
+        :param text: The part of the code
+        :param base: Position of the part in the code
+        """
+        newlines = self.newlines
+        pos = text.find('\n')
+        while pos != -1:
+            if base + pos:
+                newlines.append(base + pos)
+            pos = text.find('\n', pos + 1)
+
+    def add_chunks(self, chunks: Iterable[str]) -> Iterator[str]:
+        """
+        Indexes chunks of the code while they are passed through
+        :param chunks: Chunks of the code
+        :return: Iterator over the same chunks
+        """
+        base = 0
+        for chunk in chunks:
+            self.add(chunk, base)
+            base += len(chunk)
+            yield chunk
+
+    def replace(self, code: str, start: int, end: int, new_end: int) -> bool:
+        """
+        Updates the index after an edit of the code
+        :param code: The code after the edit
+        :param start: Start of the edited range in the old code
+        :param end: End of the edited range in the old code
+        :param new_end: End of the range in the new code
+        :return: True if line or column of positions after the edit changed
+        """
+        newlines = self.newlines
+        delta = new_end - end
+        first = bisect_left(newlines, start)
+        last = bisect_left(newlines, end)
+
+        added = array('i')
+        pos = code.find('\n', start, new_end)
+        while pos != -1:
+            if pos:
+                added.append(pos)
+            pos = code.find('\n', pos + 1, new_end)
+
+        shifted = array('i', [pos + delta for pos in newlines[last:]] if delta else newlines[last:])
+        if end == 0 and new_end and code.startswith('\n', new_end):
+            # A new line char at offset 0 wasn't indexed, now it is after the inserted text
+            shifted.insert(0, new_end)
+        elif shifted and shifted[0] == 0:
+            del shifted[0]
+
+        moved = delta != 0 or newlines[first:last] != added
+        self.newlines = newlines[:first] + added + shifted
+        if self.code is not None:
+            self.code = code
+        return moved
+
+    def locate(self, pos: int) -> Tuple[int, int]:
+        """
+        :param pos: A position in the code
+        :return: Line and column of the position
+        """
+        i = bisect_right(self.newlines, pos)
+        return i + 1, pos - self.newlines[i - 1] if i else pos + 1
+
+    def line_text(self, line: int) -> Optional[str]:
+        """
+        :param line: Number of the line
+        :return: Text of the line without the new line char or None if the code isn't kept
+        """
+        if self.code is None or line < 1 or line > len(self.newlines) + 1:
+            return None
+        start = self.newlines[line - 2] + 1 if line > 1 else 0
+        end = self.newlines[line - 1] if line <= len(self.newlines) else len(self.code)
+        return self.code[start:end]
+
+    def text(self, start: int, end: int) -> Optional[str]:
+        """
+        :return: Text of the code between two positions or None if the code isn't kept
+        """
+        if self.code is None:
+            return None
+        return self.code[start:end]
+
+    def show(self, position: Position) -> Optional[str]:
+        """
+        Shows the line of a position with a caret under it
+        :param position: The position
+        :return: The line and the caret line or None if the code isn't kept
+        """
+        text = self.line_text(position.line)
+        if text is None:
+            return None
+        width = max(1, min(position.end_pos, position.start_pos + len(text)) - position.start_pos)
+        return text + '\n' + ' ' * (position.col - 1) + '^' * width
@@ -0,0 +1,359 @@
+import time
+from typing import Dict, List, Optional, Type
+
+from . import Token, TokenType
+from .AST import Expression, Statement, BlockStatement, ExpressionStatement, ValueExpression, ValueType, \
+    PPLErrorExpression, UnaryExpression, AdditiveExpression, MultiplicativeExpression, ShiftExpression, \
+    ConditionalExpression, EqualityExpression, BitwiseExpression, LogicalExpression, NullCoalesceExpression, \
+    TernaryExpression, FOLDS, fold_binary
+from .AST.ValueExpression import VALUE_TYPES
+
+# Level of the pipeline Parser runs when it isn't given a PassManager
+DEFAULT_LEVEL = 1
+
+# Nodes of operators with two operands whose result types are in AST.FOLDS
+BINARY_NODES = (AdditiveExpression, MultiplicativeExpression, ShiftExpression, ConditionalExpression,
+                EqualityExpression, BitwiseExpression, LogicalExpression)
+
+
+def count_nodes(expression: Expression) -> int:
+    count = 0
+    stack = [expression]
+    while stack:
+        node = stack.pop()
+        count += 1
+        for child_name in node.child_names:
+            child = getattr(node, child_name)
+            if child is not None:
+                stack.append(child)
+    return count
+
+
+def integer_value(expression: Expression) -> Optional[int]:
+    """
+    :return: The value of an integer literal or None
+    """
+    if type(expression) is ValueExpression and expression.vtype is ValueType.Integer and \
+            type(expression.value.value) is int:
+        return expression.value.value
+    return None
+
+
+class OptimizerPass:
+    """
+    Base class of optimizer passes. A pass is an AST visitor:
+    run() walks a tree bottom-up and replaces every node by the result of visit()
+
+    Location "src/parser/Optimizer.py"
+    """
+    name: str = ""
+
+    def run(self, expression: Expression) -> Expression:
+        return expression.transform(self.visit)
+
+    def visit(self, node: Expression) -> Expression:
+        """
+        :param node: A node whose children are already visited
+        :return: The node, a new node or one of its children
+        """
+        return node
+
+
+class FoldPass(OptimizerPass):
+    """
+    Constant folding, the optimization Expression.optimize() does
+    """
+    name = "fold"
+
+    def visit(self, node: Expression) -> Expression:
+        return node.optimize_node()
+
+
+class RefoldPass(OptimizerPass):
+    """
+    Constant folding after the other passes. They may leave values where the fold pass found none,
+    an operation of them that would be an error is left to run, so -O2 reports the errors -O1 does
+    """
+    name = "refold"
+
+    def visit(self, node: Expression) -> Expression:
+        result = node.optimize_node()
+        if type(result) is PPLErrorExpression:
+            return node
+        return result
+
+
+class DeadBranchPass(OptimizerPass):
+    """
+    Keeps only the branch that runs of a ternary with a constant condition
+    and of a null coalescing with a constant left operand, the other operand may be any expression.
+    A branch with an error isn't removed, so errors are reported at every level
+    """
+    name = "dead-branches"
+
+    def visit(self, node: Expression) -> Expression:
+        node_type = type(node)
+        if node_type is TernaryExpression:
+            condition = node.condition_expr
+            if type(condition) is not ValueExpression or condition.vtype is not ValueType.Bool:
+                return node
+            if condition.value.value:
+                kept, dropped = node.true_expr, node.false_expr
+            else:
+                kept, dropped = node.false_expr, node.true_expr
+            if dropped is not None and dropped.check_error() is not None:
+                return node
+            if kept is None:
+                return ValueExpression(Token(TokenType.NULL, None, "null", condition.value.position))
+            return kept
+
+        if node_type is NullCoalesceExpression:
+            left = node.expr1
+            if type(left) is not ValueExpression:
+                return node
+            if left.vtype is ValueType.Null:
+                return node.expr2
+            if node.expr2.check_error() is not None:
+                return node
+            return left
+        return node
+
+
+class TypedPass(OptimizerPass):
+    """
+    Pass that knows the value types of the nodes it visited.
+    A type is known if AST.FOLDS has a result type of the operation for the operand types
+    """
+    types: Dict[int, ValueType]
+
+    def __init__(self) -> None:
+        self.types = {}
+
+    def run(self, expression: Expression) -> Expression:
+        try:
+            return expression.transform(self.visit_typed)
+        finally:
+            self.types.clear()
+
+    def visit_typed(self, node: Expression) -> Expression:
+        result = self.visit(node)
+        # The id of a dropped node may be taken by a new one, so the type of every result is written
+        vtype = self.find_type(result)
+        if vtype is None:
+            self.types.pop(id(result), None)
+        else:
+            self.types[id(result)] = vtype
+        return result
+
+    def type_of(self, node: Expression) -> Optional[ValueType]:
+        if type(node) is ValueExpression:
+            return node.vtype
+        return self.types.get(id(node))
+
+    def find_type(self, node: Expression) -> Optional[ValueType]:
+        node_type = type(node)
+        if node_type is ValueExpression:
+            return node.vtype
+        if node_type is UnaryExpression:
+            key = (node.optype.ttype, self.type_of(node.expr), None)
+        elif node_type is TernaryExpression:
+            true_type = self.type_of(node.true_expr)
+            if node.false_expr is not None and self.type_of(node.false_expr) is true_type:
+                return true_type
+            return None
+        elif node_type in BINARY_NODES:
+            key = (node.optype, self.type_of(node.expr1), self.type_of(node.expr2))
+        else:
+            return None
+        entry = FOLDS.get(key)
+        # Errors and numbers whose type follows the value, like the result of 2 ** -1, have no type
+        if entry is None or type(entry[0]) is not TokenType:
+            return None
+        return VALUE_TYPES.get(entry[0])
+
+
+class SimplifyPass(TypedPass):
+    """
+    Removes operations with an identity operand from integer expressions:
+    x + 0, 0 + x, x - 0, x * 1, 1 * x, x // 1, x << 0, x >> 0, x | 0, x ^ 0 and - - x
+    """
+    name = "simplify"
+
+    def visit(self, node: Expression) -> Expression:
+        node_type = type(node)
+        if node_type is UnaryExpression:
+            inner = node.expr
+            if node.optype.ttype is TokenType.MINUS and type(inner) is UnaryExpression and \
+                    inner.optype.ttype is TokenType.MINUS and self.type_of(inner.expr) is ValueType.Integer:
+                return inner.expr
+            return node
+        if node_type not in (AdditiveExpression, MultiplicativeExpression, ShiftExpression, BitwiseExpression):
+            return node
+
+        optype = node.optype
+        left = node.expr1
+        right = node.expr2
+        if optype in (TokenType.PLUS, TokenType.BAR, TokenType.CARET) and integer_value(left) == 0 and \
+                self.type_of(right) is ValueType.Integer:
+            return right
+        if optype is TokenType.STAR and integer_value(left) == 1 and self.type_of(right) is ValueType.Integer:
+            return right
+        if self.type_of(left) is not ValueType.Integer:
+            return node
+        if optype in (TokenType.PLUS, TokenType.MINUS, TokenType.GTGT, TokenType.LTLT,
+                      TokenType.BAR, TokenType.CARET) and integer_value(right) == 0:
+            return left
+        if optype in (TokenType.STAR, TokenType.SLASHSLASH) and integer_value(right) == 1:
+            return left
+        return node
+
+
+class ReassociatePass(TypedPass):
+    """
+    Folds the constants of integer sums and products around an operand that isn't constant:
+    (x + 1) + 2 and (1 + x) + 2 become x + 3, the same for *
+    """
+    name = "reassociate"
+
+    def visit(self, node: Expression) -> Expression:
+        node_type = type(node)
+        if node_type is not AdditiveExpression and node_type is not MultiplicativeExpression:
+            return node
+        optype = node.optype
+        inner = node.expr1
+        outer_value = node.expr2
+        if optype not in (TokenType.PLUS, TokenType.STAR) or type(inner) is not node_type or \
+                inner.optype is not optype or integer_value(outer_value) is None:
+            return node
+
+        if integer_value(inner.expr2) is not None:
+            operand, inner_value = inner.expr1, inner.expr2
+        elif integer_value(inner.expr1) is not None:
+            operand, inner_value = inner.expr2, inner.expr1
+        else:
+            return node
+        if self.type_of(operand) is not ValueType.Integer:
+            return node
+
+        folded = fold_binary(node_type(optype, inner_value, outer_value))
+        if type(folded) is not ValueExpression:
+            # Over the folding budget
+            return node
+        return node_type(optype, operand, folded)
+
+
+# Passes by their names, PassManager builds pipelines of them
+PASSES: Dict[str, Type[OptimizerPass]] = {
+    FoldPass.name: FoldPass,
+    RefoldPass.name: RefoldPass,
+    DeadBranchPass.name: DeadBranchPass,
+    SimplifyPass.name: SimplifyPass,
+    ReassociatePass.name: ReassociatePass,
+}
+
+# Pipelines of the optimization levels -O0, -O1 and -O2.
+# -O0 only compiles: errors that folding finds, like True + 1, are raised when the program runs
+PIPELINES: Dict[int, List[str]] = {
+    0: [],
+    1: ["fold"],
+    2: ["fold", "dead-branches", "simplify", "reassociate", "refold"],
+}
+
+
+class PassStats:
+    """
+    Time a pass of a pipeline took and the change of the node count it made, summed over all its runs
+    """
+    __slots__ = ("name", "runs", "seconds", "node_delta")
+
+    name: str
+    runs: int
+    seconds: float
+    node_delta: Optional[int]
+
+    def __init__(self, name: str, count_nodes: bool) -> None:
+        self.name = name
+        self.runs = 0
+        self.seconds = 0.0
+        self.node_delta = 0 if count_nodes else None
+
+
+class PassManager:
+    """
+    Runs a pipeline of named optimizer passes over statements and measures every pass.
+    Parser runs it on every statement, e.g. Parser(tokens, optimizer = PassManager(2))
+
+    Location "src/parser/Optimizer.py"
+    """
+    level: Optional[int]
+    names: List[str]
+    passes: List[OptimizerPass]
+    stats: List[PassStats]
+    count_nodes: bool
+
+    @staticmethod
+    def from_flag(flag: str, count_nodes: bool = False) -> 'PassManager':
+        """
+        :param flag: Optimization level as a command line flag: -O0, -O1 or -O2
+        """
+        if not flag.startswith("-O") or not flag[2:].isdigit() or int(flag[2:]) not in PIPELINES:
+            raise ValueError(f"Unknown optimization level {flag}, expected one of "
+                             f"{', '.join(f'-O{level}' for level in PIPELINES)}")
+        return PassManager(int(flag[2:]), count_nodes=count_nodes)
+
+    def __init__(self, level: int = DEFAULT_LEVEL, passes: Optional[List[str]] = None,
+                 count_nodes: bool = False) -> None:
+        """
+        :param level: Optimization level, a key of PIPELINES
+        :param passes: Names of passes in PASSES to run instead of the pipeline of the level
+        :param count_nodes: Count nodes before and after every pass, it takes a walk over the tree
+        """
+        self.level = None if passes is not None else level
+        self.names = list(PIPELINES[level] if passes is None else passes)
+        self.passes = [PASSES[name]() for name in self.names]
+        self.stats = [PassStats(name, count_nodes) for name in self.names]
+        self.count_nodes = count_nodes
+
+    @property
+    def flags(self) -> str:
+        """
+        :return: The pipeline as compiler flags for CodeCache and MemoryCache keys
+        """
+        if self.level is not None:
+            return f"-O{self.level}"
+        return "-O:" + ",".join(self.names)
+
+    def run(self, statement: Statement) -> Statement:
+        """
+        Runs the passes over the expressions of a BlockStatement or an ExpressionStatement
+        :return: The statement with optimized expressions
+        """
+        statements = statement.statements if isinstance(statement, BlockStatement) else [statement]
+        for optimizer_pass, stats in zip(self.passes, self.stats):
+            start = time.perf_counter()
+            delta = 0
+            for expression_statement in statements:
+                if not isinstance(expression_statement, ExpressionStatement):
+                    raise TypeError(f"PassManager can't optimize {type(expression_statement).__name__}")
+                expression = expression_statement.expression
+                if self.count_nodes:
+                    delta -= count_nodes(expression)
+                expression = optimizer_pass.run(expression)
+                if self.count_nodes:
+                    delta += count_nodes(expression)
+                expression_statement.expression = expression
+            stats.seconds += time.perf_counter() - start
+            stats.runs += 1
+            if self.count_nodes:
+                stats.node_delta += delta
+        return statement
+
+    def report(self) -> List[dict]:
+        """
+        :return: Name, number of runs, seconds and node count delta of every pass in pipeline order.
+                 Timings include counting nodes if count_nodes is on
+        """
+        return [
+            {"pass": stats.name, "runs": stats.runs, "seconds": stats.seconds, "node_delta": stats.node_delta}
+            for stats in self.stats
+        ]
@@ -1,10 +1,129 @@
-from typing import List
-
-from . import Token, TokenType, Position
+import sys
+from array import array
+from bisect import insort
+from collections.abc import Sequence
+from enum import Enum
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Type
+
+from . import Token, TokenType, Position, EOF_TOKEN, TokenBuffer, Lexer, LexerOutput
 from .AST import *
+from .Optimizer import PassManager
 from ..errors import PPLError, PPLParseException
 
 
+def error_start(error: PPLError) -> int:
+    """
+    :return: Sort key of an error, errors without a position and errors at the end of the file
+             (their position is the one of EOF_TOKEN, -1) are sorted after the others
+    """
+    position = error.position
+    if position is None or position.start_pos < 0:
+        return sys.maxsize
+    return position.start_pos
+
+
+class Associativity(Enum):
+    Left = 0
+    Right = 1
+
+
+class BinaryOperator:
+    """
+    Entry of BINARY_OPERATORS, it tells how tight an operator binds and which node it builds
+    """
+    __slots__ = ("power", "node", "optype", "associativity")
+
+    power: int
+    node: Type[Expression]
+    optype: TokenType
+    associativity: Associativity
+
+    def __init__(self, power: int, node: Type[Expression], optype: TokenType,
+                 associativity: Associativity = Associativity.Left) -> None:
+        """
+        :param power: Binding power, operators with a greater power bind tighter
+        :param node: Class of the node, it is created as node(optype, left, right)
+        :param optype: Operator type passed to the node
+        :param associativity: Which side operators of the same power group to
+        """
+        self.power = power
+        self.node = node
+        self.optype = optype
+        self.associativity = associativity
+
+
+# Binary operators from the loosest to the tightest.
+# The ternary operator is parsed by Parser.ternary() around them, prefix operators by Parser.unary()
+BINARY_OPERATORS: Dict[TokenType, BinaryOperator] = {
+    TokenType.QUESTQUEST: BinaryOperator(1, NullCoalesceExpression, TokenType.QUESTQUEST),
+
+    TokenType.BARBAR: BinaryOperator(2, LogicalExpression, TokenType.BARBAR),
+    # "or" has always built an AND node, trees are kept the same
+    TokenType.OR: BinaryOperator(2, LogicalExpression, TokenType.AND),
+
+    TokenType.XOR: BinaryOperator(3, LogicalExpression, TokenType.XOR),
+
+    TokenType.AMPAMP: BinaryOperator(4, LogicalExpression, TokenType.AMPAMP),
+    TokenType.AND: BinaryOperator(4, LogicalExpression, TokenType.AND),
+
+    TokenType.BAR: BinaryOperator(5, BitwiseExpression, TokenType.BAR),
+    TokenType.CARET: BinaryOperator(6, BitwiseExpression, TokenType.CARET),
+    TokenType.AMP: BinaryOperator(7, BitwiseExpression, TokenType.AMP),
+
+    TokenType.EQEQ: BinaryOperator(8, EqualityExpression, TokenType.EQEQ),
+    TokenType.NOTEQ: BinaryOperator(8, EqualityExpression, TokenType.NOTEQ),
+    # "is not" builds a NOT node
+    TokenType.IS: BinaryOperator(8, EqualityExpression, TokenType.IS),
+
+    TokenType.GT: BinaryOperator(9, ConditionalExpression, TokenType.GT),
+    TokenType.GTEQ: BinaryOperator(9, ConditionalExpression, TokenType.GTEQ),
+    TokenType.LT: BinaryOperator(9, ConditionalExpression, TokenType.LT),
+    TokenType.LTEQ: BinaryOperator(9, ConditionalExpression, TokenType.LTEQ),
+
+    TokenType.LTLT: BinaryOperator(10, ShiftExpression, TokenType.LTLT),
+    TokenType.GTGT: BinaryOperator(10, ShiftExpression, TokenType.GTGT),
+
+    TokenType.PLUS: BinaryOperator(11, AdditiveExpression, TokenType.PLUS),
+    TokenType.MINUS: BinaryOperator(11, AdditiveExpression, TokenType.MINUS),
+
+    TokenType.STAR: BinaryOperator(12, MultiplicativeExpression, TokenType.STAR),
+    TokenType.SLASH: BinaryOperator(12, MultiplicativeExpression, TokenType.SLASH),
+    TokenType.SLASHSLASH: BinaryOperator(12, MultiplicativeExpression, TokenType.SLASHSLASH),
+    TokenType.PERCENT: BinaryOperator(12, MultiplicativeExpression, TokenType.PERCENT),
+    TokenType.STARSTAR: BinaryOperator(12, MultiplicativeExpression, TokenType.STARSTAR),
+}
+
+# Token types as plain ints for the hot path of Parser.
+# Enum members are hashed by a Python method, ints are hashed and compared in C
+EOF_KIND = TokenType.EOF.value
+QUEST_KIND = TokenType.QUEST.value
+COLON_KIND = TokenType.COLON.value
+SEMICOLON_KIND = TokenType.SEMICOLON.value
+LPAREN_KIND = TokenType.LPAREN.value
+IS_KIND = TokenType.IS.value
+NOT_KIND = TokenType.NOT.value
+
+VALUE_KINDS = frozenset(
+    ttype.value for ttype in (TokenType.INT, TokenType.FLOAT, TokenType.STRING, TokenType.BOOL, TokenType.NULL)
+)
+PREFIX_KINDS = frozenset((TokenType.PLUS.value, TokenType.MINUS.value))
+# Kinds an expression can start with, the parser synchronizes at them after an error
+START_KINDS = VALUE_KINDS | PREFIX_KINDS | {LPAREN_KIND}
+BINARY_OPERATOR_KINDS: Dict[int, BinaryOperator] = {
+    ttype.value: operator for ttype, operator in BINARY_OPERATORS.items()
+}
+
+# What Parser.stack_expression() does when a nested expression is complete
+PAREN_FRAME = 0         # consume the right paren, it is an operand
+TRUE_BRANCH_FRAME = 1   # parse the false branch of the ternary operator
+FALSE_BRANCH_FRAME = 2  # build the ternary operator
+
+# States of Parser.stack_expression()
+OPERAND_STATE = 0
+OPERATOR_STATE = 1
+END_STATE = 2
+
+
 class ParserOutput:
     """
     Output class for Parser
@@ -12,10 +131,20 @@ class ParserOutput:
     """
     result_statement: Statement
     errors: List[PPLError]
-
-    def __init__(self, result_statement: Statement, errors: List[PPLError]):
+    spans: Optional[List[Tuple[int, int, int, int]]]
+    token_count: int
+
+    def __init__(self, result_statement: Statement, errors: List[PPLError],
+                 spans: Optional[List[Tuple[int, int, int, int]]] = None, token_count: int = 0):
+        """
+        :param spans: (start, end, key, start position in the code) of every statement if the parser kept them,
+                      Parser.reparse() reuses them
+        :param token_count: Number of tokens the statements were parsed from
+        """
         self.result_statement = result_statement
         self.errors = errors
+        self.spans = spans
+        self.token_count = token_count
 
     def check_errors(self) -> bool:
         return self.errors != []
@@ -27,37 +156,258 @@ class ParserOutput:
         return self.errors
 
 
+class ParserEngine(Enum):
+    """
+    How Parser parses expressions.
+    Both engines build the same trees, Stack doesn't take Python stack for nested expressions
+    """
+    Recursive = 0
+    Stack = 1
+
+
 class Parser:
     result_statement: BlockStatement
     errors: List[PPLError]
     tokens: List[Token]
+    # Values of the token types, an array of bytes for a TokenBuffer
+    kinds: List[int] | array
     tokens_len: int
+    token_stream: Optional[Iterator[Token]]
     pos: int
-
-    def __init__(self, tokens: List[Token]):
+    engine: ParserEngine
+    max_errors: int
+    released: int
+    spans: Optional[List[Tuple[int, int, int, int]]]
+    optimizer: Optional[PassManager]
+    # Errors of the lexer the tokens are read from and how many of them are in Parser.errors
+    lexer_errors: List[PPLError]
+    lexer_errors_taken: int
+
+    def __init__(self, tokens: Iterable[Token] | Lexer | LexerOutput, engine: ParserEngine = ParserEngine.Recursive,
+                 max_errors: int = 1, keep_spans: bool = False, optimizer: Optional[PassManager] = None):
+        """
+        :param tokens: A list of tokens or any iterable of them (e.g. Lexer.iter_tokens()).
+                       An iterable is read through a lookahead buffer that only keeps the tokens
+                       of the statement being parsed. A Lexer is read the same way and a LexerOutput
+                       like a list, their errors are added to Parser.errors. An iterable of tokens has no errors
+        :param engine: How expressions are parsed
+        :param max_errors: Parsing stops at this error. Before it the parser skips the rest
+                           of a bad statement and goes on with the next one.
+                           Errors of the lexer and of the parser are counted together, in the order of positions.
+                           A Lexer is given the same limit, a LexerOutput should be scanned with it
+        :param keep_spans: Keep token spans of statements in ParserOutput, so Parser.reparse() can reuse them
+        :param optimizer: Passes run on every statement, e.g. PassManager.from_flag("-O2").
+                          None runs Statement.optimize(), the same as the -O1 pipeline without measuring it
+        """
         self.result_statement = BlockStatement()
-        self.tokens = tokens
-        self.tokens_len = len(tokens)
+        self.lexer_errors = []
+        if isinstance(tokens, Lexer):
+            tokens.max_errors = max_errors
+            self.lexer_errors = tokens.errors
+            tokens = tokens.iter_tokens()
+        elif isinstance(tokens, LexerOutput):
+            self.lexer_errors = tokens.errors
+            tokens = tokens.tokens
+        if isinstance(tokens, TokenBuffer):
+            self.tokens = tokens
+            self.kinds = tokens.type_values()
+            self.token_stream = None
+        elif isinstance(tokens, Sequence):
+            self.tokens = tokens
+            self.kinds = [token.ttype.value for token in tokens]
+            self.token_stream = None
+        else:
+            self.tokens = []
+            self.kinds = []
+            self.token_stream = iter(tokens)
+        self.tokens_len = len(self.tokens)
         self.pos = 0
+        self.engine = engine
+        self.max_errors = max_errors
+        self.released = 0
+        self.spans = [] if keep_spans else None
+        self.optimizer = optimizer
 
         self.errors = []
+        self.lexer_errors_taken = 0
 
     def parse(self) -> ParserOutput:
-        while not self.is_at_end() and self.errors == []:
-            statement = self.parse_statement()
+        for statement in self.iter_statements():
+            self.result_statement.add(statement)
 
-            if self.errors:
+        return ParserOutput(self.result_statement, self.errors, self.spans, self.released + self.tokens_len)
+
+    @staticmethod
+    def reparse(previous: ParserOutput, tokens: List[Token], engine: ParserEngine = ParserEngine.Recursive,
+                max_errors: int = 1, optimizer: Optional[PassManager] = None) -> ParserOutput:
+        """
+        Parses the tokens again after an edit. A statement of the previous output is reused
+        if its tokens and the token after it are the same, it is found by its token span and the hash of them.
+        Only the statements between the reused ones are parsed and optimized.
+        The previous output is taken over: its BlockStatement and spans are patched in place.
+        Tokens moved by Lexer.relex() keep their positions right, positions of folded values and errors
+        in reused trees are moved by the same number of chars
+        :param previous: Output of parse() of a Parser created with keep_spans=True
+        :param tokens: All tokens after the edit, e.g. output of Lexer.relex()
+        :param engine: How expressions are parsed
+        :param max_errors: Parsing stops at this error
+        :param optimizer: Passes run on the parsed statements, it should be the one of the previous parse
+        """
+        parser = Parser(tokens, engine, max_errors, True, optimizer)
+        spans = previous.spans
+        if previous.errors or spans is None:
+            # A statement with an error isn't kept, so there is no span to match the tokens after it
+            return parser.parse()
+
+        count = len(spans)
+        delta = parser.tokens_len - previous.token_count
+        # Statements before the edit are at the same token positions
+        first = 0
+        while first < count and parser.span_key(spans[first][0], spans[first][1]) == spans[first][2]:
+            first += 1
+        start = spans[first - 1][1] if first else 0
+        # Statements after the edit are shifted by the change of the token count
+        last = count
+        while last > first:
+            span_start, span_end, key, _ = spans[last - 1]
+            if span_start + delta < start or parser.span_key(span_start + delta, span_end + delta) != key:
                 break
+            last -= 1
+
+        # Statements are parsed until one ends where a reused statement starts,
+        # reused statements that a parsed one runs into are dropped
+        parsed: List[Statement] = []
+        statements = parser.iter_statements()
+        parser.pos = start
+        while last == count or parser.pos != spans[last][0] + delta:
+            statement = next(statements, None)
+            if parser.errors:
+                return Parser(tokens, engine, max_errors, True, optimizer).parse()
+            if statement is None:
+                last = count
+                break
+            parsed.append(statement)
+            while last < count and spans[last][0] + delta < parser.pos:
+                last += 1
+
+        block = previous.result_statement
+        # An edit may move chars without changing tokens, e.g. new lines before the first statement
+        spans[:first] = [Parser.reuse_span(statement, span, 0, tokens)
+                         for statement, span in zip(block.statements[:first], spans[:first])]
+        moved_spans = [Parser.reuse_span(statement, span, delta, tokens)
+                       for statement, span in zip(block.statements[last:], spans[last:])]
+        block.statements[first:last] = parsed
+        spans[first:] = parser.spans + moved_spans
+        return ParserOutput(block, [], spans, parser.tokens_len)
+
+    @staticmethod
+    def reuse_span(statement: ExpressionStatement, span: Tuple[int, int, int, int], delta: int,
+                   tokens: List[Token]) -> Tuple[int, int, int, int]:
+        """
+        Moves a reused statement to its tokens after the edit
+        :param delta: Change of the token positions of the statement
+        :return: The span of the statement after the edit
+        """
+        span_start, span_end, key, char_start = span
+        span_start += delta
+        span_end += delta
+        char_delta = tokens[span_start].position.start_pos - char_start
+        if char_delta:
+            Parser.move_positions(statement, tokens[span_start:span_end], char_delta)
+        return span_start, span_end, key, char_start + char_delta
+
+    @staticmethod
+    def move_positions(statement: ExpressionStatement, tokens: List[Token], delta: int) -> None:
+        """
+        Shifts the positions of a reused tree that aren't positions of its tokens.
+        Folded values and errors have positions of their own, every position is moved once
+        :param tokens: Tokens of the statement, Lexer.relex() has already moved them
+        """
+        seen = {id(token.position) for token in tokens}
+        stack: List[Expression] = [statement.expression]
+        while stack:
+            node = stack.pop()
+            node_type = type(node)
+            if node_type is ValueExpression:
+                position = node.value.position
+            elif node_type is UnaryExpression:
+                position = node.optype.position
+            elif node_type is PPLErrorExpression:
+                position = node.position
+            else:
+                position = None
+            if position is not None and id(position) not in seen:
+                seen.add(id(position))
+                position.move(delta)
+            for child_name in node.child_names:
+                child = getattr(node, child_name)
+                if child is not None:
+                    stack.append(child)
+
+    def iter_statements(self, optimize: bool = True) -> Iterator[Statement]:
+        """
+        Lazy version of parse(), every statement is yielded right after it is parsed, optimized and checked,
+        so it can be compiled and dropped before the next one is parsed.
+        Statements aren't added to Parser.result_statement. Errors are collected in Parser.errors,
+        a statement that can't be parsed isn't yielded. Parsing stops at max_errors errors
+        :param optimize: False to yield statements as they are parsed, e.g. to optimize them in an AST.Arena
+        :return: Iterator over statements
+        """
+        while not self.is_at_end() and len(self.errors) < self.max_errors:
+            self.release_tokens()
+            start = self.pos
+            error_count = len(self.errors)
+            statement = self.parse_statement()
+
+            if len(self.errors) > error_count:
+                self.synchronize(start)
+                self.take_lexer_errors(self.pos)
+                del self.errors[self.max_errors:]
+                continue
+            self.match_kind(SEMICOLON_KIND)
+            # A bad lexeme among the tokens of the statement stops the compilation before it is compiled
+            self.take_lexer_errors(self.pos)
+            if self.spans is not None:
+                self.spans.append((self.released + start, self.released + self.pos, self.span_key(start, self.pos),
+                                   self.tokens[start].position.start_pos))
+            if not optimize:
+                yield statement
+                continue
 
-            statement = statement.optimize()
+            if self.optimizer is None:
+                statement = statement.optimize()
+            else:
+                statement = self.optimizer.run(statement)
             statement_error = statement.check_error()
 
             if isinstance(statement_error, PPLErrorExpression):
-                self.errors.append(statement_error.to_exception())
-
-            self.result_statement.add(statement)
-
-        return ParserOutput(self.result_statement, self.errors)
+                self.add_error(statement_error.to_exception())
+
+            yield statement
+        self.take_lexer_errors()
+        del self.errors[self.max_errors:]
+
+    def add_error(self, error: PPLError) -> None:
+        """
+        Adds an error to Parser.errors in the order of positions, so max_errors keeps the first ones in the code
+        """
+        insort(self.errors, error, key=error_start)
+
+    def take_lexer_errors(self, end: Optional[int] = None) -> None:
+        """
+        Adds errors of the lexer to Parser.errors in the order of their positions
+        :param end: Position of the token after the parsed ones, only errors before the last parsed token
+                    are taken. All errors are taken if it is None
+        """
+        lexer_errors = self.lexer_errors
+        taken = self.lexer_errors_taken
+        if taken == len(lexer_errors):
+            return
+        end_pos = sys.maxsize if end is None else self.tokens[end - 1].position.end_pos
+        while taken < len(lexer_errors) and error_start(lexer_errors[taken]) < end_pos:
+            self.add_error(lexer_errors[taken])
+            taken += 1
+        self.lexer_errors_taken = taken
 
     def parse_statement(self) -> Statement:
         # if self.match(TokenType.PRINT):
@@ -120,16 +470,22 @@ class Parser:
         return self.assignment_statement()
 
     def assignment_statement(self) -> Statement:
+        error_count = len(self.errors)
         expression = self.expression()
         if expression:
             return ExpressionStatement(expression)
-        self.errors.append(PPLParseException("Unknown statement: " + self.peek().ttype.name))
+        # The reason is already reported by the expression
+        if len(self.errors) == error_count:
+            self.add_error(PPLParseException("Unknown statement: " + self.peek().ttype.name))
 
     def expression(self) -> Expression:
+        if self.engine == ParserEngine.Stack:
+            return self.stack_expression()
+
         expr = self.assignment()
 
         if isinstance(expr, PPLErrorExpression):
-            self.errors.append(expr.to_exception())
+            self.add_error(expr.to_exception())
 
         return expr
 
@@ -142,12 +498,12 @@ class Parser:
         return self.ternary()
 
     def ternary(self) -> Expression:
-        result = self.null_coalesce()
+        result = self.binary(0)
 
         while True:
-            if self.match(TokenType.QUEST):
+            if self.match_kind(QUEST_KIND):
                 result1 = self.expression()
-                if self.match(TokenType.COLON):
+                if self.match_kind(COLON_KIND):
                     result = TernaryExpression(result, result1, self.expression())
                 else:
                     result = TernaryExpression(result, result1, None)
@@ -155,202 +511,178 @@ class Parser:
             break
         return result
 
-    def null_coalesce(self) -> Expression:
-        result = self.logical_or()
-
-        while True:
-            if self.match(TokenType.QUESTQUEST):
-                result = NullCoalesceExpression(TokenType.QUESTQUEST, result, self.logical_or())
-                continue
-            break
-        return result
-
-    def logical_or(self) -> Expression:
-        result = self.logical_xor()
-
-        while True:
-            if self.match(TokenType.BARBAR):
-                result = LogicalExpression(TokenType.BARBAR, result, self.logical_xor())
-                continue
-            elif self.match(TokenType.OR):
-                result = LogicalExpression(TokenType.AND, result, self.logical_xor())
-                continue
-            break
-        return result
-
-    def logical_xor(self) -> Expression:
-        result = self.logical_and()
-
-        while True:
-            if self.match(TokenType.XOR):
-                result = LogicalExpression(TokenType.XOR, result, self.logical_and())
-                continue
-            break
-        return result
-
-    def logical_and(self) -> Expression:
-        result = self.bitwise_or()
-
-        while True:
-            if self.match(TokenType.AMPAMP):
-                result = LogicalExpression(TokenType.AMPAMP, result, self.bitwise_or())
-                continue
-            elif self.match(TokenType.AND):
-                result = LogicalExpression(TokenType.AND, result, self.bitwise_or())
-                continue
-            break
-        return result
-
-    def bitwise_or(self) -> Expression:
-        result = self.bitwise_xor()
-
-        while True:
-            if self.match(TokenType.BAR):
-                result = BitwiseExpression(TokenType.BAR, result, self.bitwise_xor())
-                continue
-            break
-        return result
-
-    def bitwise_xor(self) -> Expression:
-        result = self.bitwise_and()
-
-        while True:
-            if self.match(TokenType.CARET):
-                result = BitwiseExpression(TokenType.CARET, result, self.bitwise_and())
-                continue
-            break
-        return result
-
-    def bitwise_and(self) -> Expression:
-        result = self.equality()
-
-        while True:
-            if self.match(TokenType.AMP):
-                result = BitwiseExpression(TokenType.AMP, result, self.equality())
-                continue
-            break
-        return result
-
-    def equality(self) -> Expression:
-        result = self.conditional()
-
-        while True:
-            if self.match(TokenType.EQEQ):
-                result = EqualityExpression(TokenType.EQEQ, result, self.conditional())
-                continue
-            elif self.match(TokenType.NOTEQ):
-                result = EqualityExpression(TokenType.NOTEQ, result, self.conditional())
-                continue
-            elif self.match(TokenType.IS):
-                if self.match(TokenType.NOT):
-                    result = EqualityExpression(TokenType.NOT, result, self.conditional())
-                    continue
-                result = EqualityExpression(TokenType.IS, result, self.conditional())
-                continue
-            break
-        return result
-
-    def conditional(self) -> Expression:
-        result = self.shift()
-
-        while True:
-            if self.match(TokenType.GT):
-                result = ConditionalExpression(TokenType.GT, result, self.shift())
-                continue
-            elif self.match(TokenType.GTEQ):
-                result = ConditionalExpression(TokenType.GTEQ, result, self.shift())
-                continue
-            elif self.match(TokenType.LT):
-                result = ConditionalExpression(TokenType.LT, result, self.shift())
-                continue
-            elif self.match(TokenType.LTEQ):
-                result = ConditionalExpression(TokenType.LTEQ, result, self.shift())
-                continue
-            break
-        return result
-
-    def shift(self) -> Expression:
-        result = self.additive()
-
-        while True:
-            if self.match(TokenType.LTLT):
-                result = ShiftExpression(TokenType.LTLT, result, self.additive())
-                continue
-            elif self.match(TokenType.GTGT):
-                result = ShiftExpression(TokenType.GTGT, result, self.additive())
-                continue
-            break
-        return result
-
-    def additive(self) -> Expression:
-        result = self.multiplicative()
-
-        while True:
-            if self.match(TokenType.PLUS):
-                result = AdditiveExpression(TokenType.PLUS, result, self.multiplicative())
-                continue
-            elif self.match(TokenType.MINUS):
-                result = AdditiveExpression(TokenType.MINUS, result, self.multiplicative())
-                continue
-            break
-        return result
-
-    def multiplicative(self) -> Expression:
+    def binary(self, min_power: int) -> Expression:
+        """
+        Parses binary operators by precedence climbing over BINARY_OPERATORS
+        :param min_power: Only operators that bind at least that tight are parsed
+        """
         result = self.unary()
 
         while True:
-            if self.match(TokenType.STAR):
-                result = MultiplicativeExpression(TokenType.STAR, result, self.unary())
-                continue
-            elif self.match(TokenType.SLASH):
-                result = MultiplicativeExpression(TokenType.SLASH, result, self.unary())
-                continue
-            elif self.match(TokenType.SLASHSLASH):
-                result = MultiplicativeExpression(TokenType.SLASHSLASH, result, self.unary())
-                continue
-            elif self.match(TokenType.PERCENT):
-                result = MultiplicativeExpression(TokenType.PERCENT, result, self.unary())
-                continue
-            elif self.match(TokenType.STARSTAR):
-                result = MultiplicativeExpression(TokenType.STARSTAR, result, self.unary())
-                continue
-            break
-        return result
+            kind = self.kind()
+            operator = BINARY_OPERATOR_KINDS.get(kind)
+            if operator is None or operator.power < min_power:
+                return result
+            self.pos += 1
+
+            optype = operator.optype
+            if kind == IS_KIND and self.match_kind(NOT_KIND):
+                optype = TokenType.NOT
+            right = self.binary(operator.power + 1 if operator.associativity == Associativity.Left else operator.power)
+            result = operator.node(optype, result, right)
 
     def unary(self) -> Expression:
-        if self.match(TokenType.PLUS):
-            return UnaryExpression(self.peek(-1), self.primary())
-        elif self.match(TokenType.MINUS):
-            return UnaryExpression(self.peek(-1), self.primary())
+        if self.kind() in PREFIX_KINDS:
+            self.pos += 1
+            return UnaryExpression(self.tokens[self.pos - 1], self.primary())
 
         return self.primary()
 
     def primary(self) -> Expression:
-        if self.match(TokenType.LPAREN):
+        kind = self.kind()
+        if kind == LPAREN_KIND:
+            self.pos += 1
             result = self.expression()
             self.consume(TokenType.RPAREN)
             return result
 
-        return self.variable()
+        # TODO! variables
+        if kind in VALUE_KINDS:
+            self.pos += 1
+            return ValueExpression(self.tokens[self.pos - 1])
 
-    def variable(self) -> Expression:
-        # TODO!
-        return self.value()
+        self.unknown_expression()
 
-    def value(self) -> Expression:
+    def unknown_expression(self) -> None:
         token: Token = self.peek()
+        self.add_error(PPLParseException(f"Unknown expression: {token.ttype.get_name()}", token.position))
+
+    def stack_expression(self) -> Expression:
+        """
+        Parses an expression like expression() does, nested expressions are kept on explicit stacks.
+        Binary operators are parsed by shunting-yard over BINARY_OPERATORS,
+        so the Python stack doesn't grow with nesting
+        """
+        tokens = self.tokens
+        # Expressions that wait for a nested one: (frame type, data, operands, operators)
+        frames: List[Tuple[int, object, List[Expression], List[Tuple[BinaryOperator, TokenType]]]] = []
+        operands: List[Expression] = []
+        operators: List[Tuple[BinaryOperator, TokenType]] = []
+        result: Optional[Expression] = None
+        state = OPERAND_STATE
+
+        while True:
+            if state == OPERAND_STATE:
+                # A value or an expression in parens, both with an optional prefix operator
+                prefix = None
+                kind = self.kind()
+                if kind in PREFIX_KINDS:
+                    prefix = tokens[self.pos]
+                    self.pos += 1
+                    kind = self.kind()
+
+                if kind == LPAREN_KIND:
+                    self.pos += 1
+                    frames.append((PAREN_FRAME, prefix, operands, operators))
+                    operands = []
+                    operators = []
+                    continue
 
-        if self.match(TokenType.INT, TokenType.FLOAT, TokenType.STRING, TokenType.BOOL, TokenType.NULL):
-            return ValueExpression(token)
+                if kind in VALUE_KINDS:
+                    operand = ValueExpression(tokens[self.pos])
+                    self.pos += 1
+                else:
+                    operand = self.unknown_expression()
+                operands.append(operand if prefix is None else UnaryExpression(prefix, operand))
+                state = OPERATOR_STATE
+
+            elif state == OPERATOR_STATE:
+                kind = self.kind()
+                operator = BINARY_OPERATOR_KINDS.get(kind)
+                if operator is None:
+                    while operators:
+                        operator, optype = operators.pop()
+                        right = operands.pop()
+                        operands.append(operator.node(optype, operands.pop(), right))
+                    result = operands.pop()
+                    state = END_STATE
+                    continue
+
+                self.pos += 1
+                optype = operator.optype
+                if kind == IS_KIND and self.match_kind(NOT_KIND):
+                    optype = TokenType.NOT
+
+                power = operator.power
+                left = operator.associativity == Associativity.Left
+                while operators and (operators[-1][0].power > power or left and operators[-1][0].power == power):
+                    top, top_optype = operators.pop()
+                    right = operands.pop()
+                    operands.append(top.node(top_optype, operands.pop(), right))
+                operators.append((operator, optype))
+                state = OPERAND_STATE
+
+            else:
+                # The binary operators of an expression are parsed, the ternary operator may follow
+                if self.match_kind(QUEST_KIND):
+                    frames.append((TRUE_BRANCH_FRAME, result, operands, operators))
+                    operands = []
+                    operators = []
+                    state = OPERAND_STATE
+                    continue
 
-        self.errors.append(PPLParseException(f"Unknown expression: {token.ttype.get_name()}", token.position))
+                if isinstance(result, PPLErrorExpression):
+                    self.add_error(result.to_exception())
+                if not frames:
+                    return result
+
+                frame, data, operands, operators = frames.pop()
+                if frame == PAREN_FRAME:
+                    self.consume(TokenType.RPAREN)
+                    operands.append(result if data is None else UnaryExpression(data, result))
+                    state = OPERATOR_STATE
+                elif frame == TRUE_BRANCH_FRAME:
+                    if self.match_kind(COLON_KIND):
+                        frames.append((FALSE_BRANCH_FRAME, (data, result), operands, operators))
+                        operands = []
+                        operators = []
+                        state = OPERAND_STATE
+                    else:
+                        result = TernaryExpression(data, result, None)
+                else:
+                    condition_expr, true_expr = data
+                    result = TernaryExpression(condition_expr, true_expr, result)
+
+    def span_key(self, start: int, end: int) -> int:
+        """
+        :return: Hash of the tokens of a statement and of the token after it,
+                 the tree of the statement depends only on them
+        """
+        end += 1
+        return hash((tuple(self.kinds[start:end]), tuple([token.lexeme for token in self.tokens[start:end]])))
+
+    def synchronize(self, start: int) -> None:
+        """
+        Panic mode: skips tokens after a bad statement up to a semicolon or
+        a token an expression starts with, the next statement is parsed from there
+        :param start: Position of the first token of the bad statement
+        """
+        if self.pos == start and not self.is_at_end():
+            self.pos += 1
+        while True:
+            kind = self.kind()
+            if kind == EOF_KIND or kind in START_KINDS:
+                return
+            self.pos += 1
+            if kind == SEMICOLON_KIND:
+                return
 
     def consume(self, ttype: TokenType) -> None:
-        if self.peek().ttype == ttype:
-            self.next()
+        if self.kind() == ttype.value:
+            self.pos += 1
         else:
             position = self.peek().position
-            self.errors.append(
+            self.add_error(
                 PPLParseException(
                     f"There should be {ttype.to_article()} {ttype.get_name()}",
                     Position.from3(position.end_pos, position.line, position.col)
@@ -362,6 +694,15 @@ class Parser:
             return True
         return False
 
+    def match_kind(self, kind: int) -> bool:
+        """
+        Fast version of match() for one token type given as an int
+        """
+        if self.kind() == kind:
+            self.pos += 1
+            return True
+        return False
+
     def match(self, *ttype: TokenType) -> bool:
         if self.peek().ttype in ttype:
             self.next()
@@ -374,9 +715,48 @@ class Parser:
 
     def peek(self, relative: int = 0) -> Token:
         if self.is_at_end(relative):
-            return Token.from3(TokenType.EOF, "EOF", Position(-1, -1, -1, -1))
+            return EOF_TOKEN
 
         return self.tokens[self.pos + relative]
 
     def is_at_end(self, relative: int = 0) -> bool:
-        return self.pos + relative >= self.tokens_len or self.tokens[self.pos + relative].ttype == TokenType.EOF
+        return self.kind(relative) == EOF_KIND
+
+    def kind(self, relative: int = 0) -> int:
+        """
+        :return: Type of a token as an int, EOF_KIND past the end
+        """
+        index = self.pos + relative
+        if index >= self.tokens_len and not self.fill_tokens(index + 1):
+            return EOF_KIND
+        return self.kinds[index]
+
+    def fill_tokens(self, count: int) -> bool:
+        """
+        Reads tokens from the token stream until the buffer holds count tokens
+        :param count: Required buffer size
+        :return: True if the buffer holds enough tokens
+        """
+        if self.token_stream is None:
+            return False
+
+        for token in self.token_stream:
+            self.tokens.append(token)
+            self.kinds.append(token.ttype.value)
+            self.tokens_len += 1
+            if self.tokens_len >= count:
+                return True
+
+        self.token_stream = None
+        return False
+
+    def release_tokens(self) -> None:
+        """
+        Drops already parsed tokens from the lookahead buffer. Does nothing for a list of tokens
+        """
+        if self.token_stream is not None and self.pos:
+            del self.tokens[:self.pos]
+            del self.kinds[:self.pos]
+            self.tokens_len -= self.pos
+            self.released += self.pos
+            self.pos = 0
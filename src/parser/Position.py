@@ -1,29 +1,66 @@
+from typing import Optional
+
+
 class Position:
     """
     This class is used to mark positions of tokens, statements and errors.
 
     Location "src/parser/Position.py"
     """
+    __slots__ = ("start_pos", "end_pos", "_line", "_col", "lines")
+
     start_pos: int
     end_pos: int
-    line: int
-    col: int
+    lines: Optional['LineIndex']
 
     @staticmethod
     def from3(pos: int, line: int, col: int):
         return Position(pos, pos, line, col)
 
-    def __init__(self, start_pos: int, end_pos: int, line: int, col: int) -> None:
+    def __init__(self, start_pos: int, end_pos: int, line: Optional[int], col: Optional[int],
+                 lines: 'LineIndex' = None) -> None:
         """
         :param start_pos: The start position
         :param end_pos: The end position
-        :param line: The line
-        :param col: The column
+        :param line: The line or None to find it in lines
+        :param col: The column or None to find it in lines
+        :param lines: Line index of the code, line and column are found in it only when they are needed
         """
         self.start_pos = start_pos
         self.end_pos = end_pos
-        self.line = line
-        self.col = col
+        self._line = line
+        self._col = col
+        self.lines = lines
+
+    @property
+    def line(self) -> int:
+        if self._line is None:
+            self._line, self._col = self.lines.locate(self.start_pos)
+        return self._line
+
+    @property
+    def col(self) -> int:
+        if self._col is None:
+            self._line, self._col = self.lines.locate(self.start_pos)
+        return self._col
+
+    def text(self) -> Optional[str]:
+        """
+        :return: Text of the code at the position or None if the code isn't kept
+        """
+        if self.lines is None:
+            return None
+        return self.lines.text(self.start_pos, self.end_pos)
+
+    def move(self, delta: int) -> None:
+        """
+        Shifts the position, line and column are found in the line index again when they are needed
+        :param delta: Number of chars to shift by
+        """
+        self.start_pos += delta
+        self.end_pos += delta
+        self._line = None
+        self._col = None
 
     def __repr__(self) -> str:
         return f"start_pos: {self.start_pos}, end_pos: {self.end_pos}, line: {self.line}, col: {self.col}"
@@ -1,8 +1,11 @@
-from typing import Optional, Dict, List
+from typing import Dict, List, Optional, Union
 from enum import Enum
 
 from . import Position
 
+# Value of a Token: native value of a literal or the name of an identifier or keyword
+LiteralValue = Union[int, float, bool, str, None]
+
 
 class TokenType(Enum):
     INT = 0
@@ -43,7 +46,7 @@ class TokenType(Enum):
     QUEST = 48       # ?
     QUESTQUEST = 49  # ??
     COLON = 50       # :
-    SEMICOLON = 50   # ;
+    SEMICOLON = 51   # ;
 
     LPAREN = 60      # (
     RPAREN = 61      # )
@@ -61,12 +64,17 @@ class TokenType(Enum):
 
     EOF = -1
 
+    # Members are singletons compared by identity, Enum.__hash__() hashes the name in Python code.
+    # Token types are looked up in tables on every token and every folded node
+    __hash__ = object.__hash__
+
     def to_article(self) -> str:
         article_map: Dict[str, List['TokenType']] = {
             "an": [
                 self.INT, self.IDENTIFIER,
                 self.PLUSPLUS,
                 self.AMP,
+                self.EQ,
                 self.AMPAMP, self.BARBAR, self.EQEQ, self.EXCL,
                 self.IS,
                 self.AND, self.OR,
@@ -78,7 +86,7 @@ class TokenType(Enum):
                 self.MINUSMINUS, self.STARSTAR, self.SLASHSLASH,
                 self.GT, self.LT, self.GTGT, self.LTLT, self.BAR, self.CARET,
                 self.NOTEQ, self.GTEQ, self.LTEQ,
-                self.QUEST, self.QUESTQUEST,
+                self.QUEST, self.QUESTQUEST, self.COLON, self.SEMICOLON,
                 self.LPAREN, self.RPAREN, self.LBRACE, self.RBRACE, self.LCURBRACE, self.RCURBRACE,
                 self.NOT,
                 self.XOR,
@@ -102,6 +110,7 @@ class TokenType(Enum):
             self.STAR: "star",
             self.SLASH: "slash",
             self.PERCENT: "percent",
+            self.EQ: "equal sign",
 
             self.PLUSPLUS: "increment",
             self.MINUSMINUS: "decrement",
@@ -126,6 +135,8 @@ class TokenType(Enum):
 
             self.QUEST: "question mark",
             self.QUESTQUEST: "null coalesce operator",
+            self.COLON: "colon",
+            self.SEMICOLON: "semicolon",
 
             self.LPAREN: "left paren",
             self.RPAREN: "right paren",
@@ -149,9 +160,12 @@ class Token:
     """
     Token class represents a lexeme that will be converted to statement in Parser
     """
+    __slots__ = ("ttype", "value", "lexeme", "position")
+
     ttype: TokenType
-    value: Optional[str]
-    lexeme: str
+    value: LiteralValue
+    # Values made by constant folding have no lexeme, their text is found by text()
+    lexeme: Optional[str]
     position: Position
 
     @staticmethod
@@ -163,10 +177,10 @@ class Token:
         """
         return Token(ttype, None, lexeme, position)
 
-    def __init__(self, ttype: TokenType, value: str, lexeme: str, position: Position) -> None:
+    def __init__(self, ttype: TokenType, value: LiteralValue, lexeme: str, position: Position) -> None:
         """
         :param ttype: Token type
-        :param value: The value of Token
+        :param value: The value of Token, literals keep their native Python value
         :param lexeme: Lexeme
         :param position: Position of Token in code
         """
@@ -175,8 +189,20 @@ class Token:
         self.lexeme = lexeme
         self.position = position
 
+    def text(self) -> Optional[str]:
+        """
+        :return: The lexeme or the text of the code at the position if the token has no lexeme
+        """
+        if self.lexeme is not None:
+            return self.lexeme
+        return self.position.text()
+
     def __repr__(self) -> str:
         """
         This is a debug function
         """
         return f"{self.ttype.name}"
+
+
+# Shared end of file token, it must not be changed
+EOF_TOKEN = Token.from3(TokenType.EOF, "EOF", Position(-1, -1, -1, -1))
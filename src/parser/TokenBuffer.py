@@ -0,0 +1,116 @@
+from array import array
+from collections.abc import Sequence
+from typing import Iterable, List, Optional
+
+from . import Token, TokenType, LiteralValue, Position
+from .Lexer import FIRST_OPERATORS, SECOND_OPERATORS, KEYWORD_VALUES, number_value
+
+# Kinds of tokens whose lexeme is always the same
+FIXED_KINDS = [(ttype, lexeme) for lexeme, ttype in (FIRST_OPERATORS | SECOND_OPERATORS).items()]
+FIXED_KINDS.append((TokenType.EOF, "EOF"))
+# Kinds of tokens whose lexeme is taken from the source
+SOURCE_KINDS = [
+    TokenType.INT, TokenType.FLOAT, TokenType.STRING, TokenType.IDENTIFIER, TokenType.BOOL, TokenType.NULL,
+    TokenType.IS, TokenType.NOT, TokenType.AND, TokenType.XOR, TokenType.OR,
+]
+
+KIND_TYPES = [ttype for ttype, _ in FIXED_KINDS] + SOURCE_KINDS
+KIND_VALUES = [ttype.value for ttype in KIND_TYPES]
+KIND_LEXEMES = [lexeme for _, lexeme in FIXED_KINDS] + [None] * len(SOURCE_KINDS)
+FIXED_KIND_CODES = {lexeme: kind for kind, (_, lexeme) in enumerate(FIXED_KINDS)}
+SOURCE_KIND_CODES = {ttype: len(FIXED_KINDS) + i for i, ttype in enumerate(SOURCE_KINDS)}
+
+
+class TokenBuffer(Sequence):
+    """
+    Compact token store. Tokens are kept in parallel integer columns,
+    a Token is only created when it is accessed.
+
+    Location "src/parser/TokenBuffer.py"
+    """
+    source: str
+    kinds: array
+    starts: array
+    ends: array
+    lines: array
+    cols: array
+    cached_index: int
+    cached_token: Optional[Token]
+
+    @staticmethod
+    def from_tokens(tokens: Iterable[Token], source: str) -> 'TokenBuffer':
+        """
+        :param tokens: Tokens to store, e.g. Lexer.iter_tokens()
+        :param source: The code the tokens were scanned from
+        """
+        buffer = TokenBuffer(source)
+        for token in tokens:
+            buffer.append(token)
+        return buffer
+
+    def __init__(self, source: str) -> None:
+        """
+        :param source: The code the tokens are scanned from
+        """
+        self.source = source
+        self.kinds = array('i')
+        self.starts = array('i')
+        self.ends = array('i')
+        self.lines = array('i')
+        self.cols = array('i')
+        self.cached_index = -1
+        self.cached_token = None
+
+    def append(self, token: Token) -> None:
+        kind = SOURCE_KIND_CODES.get(token.ttype)
+        self.kinds.append(FIXED_KIND_CODES[token.lexeme] if kind is None else kind)
+        position = token.position
+        self.starts.append(position.start_pos)
+        self.ends.append(position.end_pos)
+        self.lines.append(position.line)
+        self.cols.append(position.col)
+
+    def type_values(self) -> array:
+        """
+        :return: Values of the token types of all tokens, Parser uses them as plain int kinds.
+                 They fit in a signed byte, so the column takes a byte per token
+        """
+        return array('b', map(KIND_VALUES.__getitem__, self.kinds))
+
+    def ttype(self, index: int) -> TokenType:
+        return KIND_TYPES[self.kinds[index]]
+
+    def lexeme(self, index: int) -> str:
+        lexeme = KIND_LEXEMES[self.kinds[index]]
+        if lexeme is None:
+            return self.source[self.starts[index]:self.ends[index]]
+        return lexeme
+
+    def value(self, index: int) -> LiteralValue:
+        ttype = self.ttype(index)
+        if ttype not in SOURCE_KIND_CODES:
+            return None
+        lexeme = self.lexeme(index)
+        if ttype == TokenType.INT or ttype == TokenType.FLOAT:
+            return number_value(lexeme)[1]
+        return KEYWORD_VALUES.get(lexeme, lexeme)
+
+    def position(self, index: int) -> Position:
+        return Position(self.starts[index], self.ends[index], self.lines[index], self.cols[index])
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __getitem__(self, index: int | slice) -> Token | List[Token]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        # Parser peeks the same token many times in a row
+        if index == self.cached_index:
+            return self.cached_token
+
+        token = Token(self.ttype(index), self.value(index), self.lexeme(index), self.position(index))
+        self.cached_index = index
+        self.cached_token = token
+        return token
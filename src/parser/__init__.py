@@ -1,5 +1,8 @@
 from .Position import Position
-from .Token import TokenType, Token
-from .Lexer import Lexer, LexerOutput
-from .Parser import Parser, ParserOutput
+from .LineIndex import LineIndex
+from .Token import TokenType, Token, LiteralValue, EOF_TOKEN
+from .Lexer import Lexer, LexerOutput, LexerEngine
+from .TokenBuffer import TokenBuffer
+from .Optimizer import PassManager, OptimizerPass, PASSES, PIPELINES
+from .Parser import Parser, ParserOutput, ParserEngine
 from . import AST